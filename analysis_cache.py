@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+ANALYSIS_SCHEMA_VERSION = 3
+
+
+def _copy_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    copied = dict(result)
+    if 'fields' in copied:
+        copied['fields'] = [dict(field) for field in copied['fields']]
+    return copied
+
+
+class AnalysisCache:
+
+    def __init__(self, cache_dir: Optional[str] = None, max_entries: int = 128):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._signatures: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def content_hash(self, file_path: str) -> str:
+        abs_path = os.path.abspath(file_path)
+        stat = os.stat(abs_path)
+
+        with self._lock:
+            known = self._signatures.get(abs_path)
+        if known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+
+        digest = hashlib.sha256()
+        with open(abs_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+
+        with self._lock:
+            self._signatures[abs_path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+        return content_hash
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def get(self, content_hash: str, schema: str) -> Optional[Dict[str, Any]]:
+        key = content_hash
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['schema'] == schema:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copy_result(entry['result'])
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    stored = json.load(f)
+            except (OSError, ValueError):
+                stored = None
+
+            if stored and stored.get('schema') == schema:
+                result = self._restore(stored['result'])
+                self._remember(key, schema, result)
+                with self._lock:
+                    self.disk_hits += 1
+                return _copy_result(result)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, content_hash: str, schema: str, result: Dict[str, Any]):
+        key = content_hash
+        self._remember(key, schema, _copy_result(result))
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'schema': schema, 'result': result}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+    def _remember(self, key: str, schema: str, result: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = {'schema': schema, 'result': result}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _restore(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        for field in result.get('fields', []):
+            if field.get('captured') is not None:
+                field['captured'] = tuple(field['captured'])
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._signatures.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / total if total else 0.0
+            }
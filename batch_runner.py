@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from database_manager import DatabaseManager
+from document_filler import DocumentFiller
+from template_store import TemplateStore
+
+
+def manifest_hash(jobs: List[Dict]) -> str:
+    digest = hashlib.sha256()
+    for job in jobs:
+        digest.update(json.dumps(
+            [job['template_path'], job['output_path'], job.get('data'), job.get('mapping')],
+            ensure_ascii=False, sort_keys=True, default=str
+        ).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def jobs_for_templates(template_paths: List[str], data: Dict, output_dir: str,
+                       mapping: Optional[Dict] = None) -> List[Dict]:
+    return [{
+        'template_path': template_path,
+        'output_path': os.path.join(output_dir, f"filled_{os.path.basename(template_path)}"),
+        'data': data,
+        'mapping': mapping
+    } for template_path in template_paths]
+
+
+class BatchRunner:
+
+    def __init__(self, db: DatabaseManager, filler: Optional[DocumentFiller] = None,
+                 checkpoint_every: int = 100, max_attempts: int = 3):
+        self.db = db
+        self.filler = filler if filler is not None else DocumentFiller()
+        self.checkpoint_every = checkpoint_every
+        self.max_attempts = max_attempts
+
+    def run(self, jobs: List[Dict], resume_existing: bool = True) -> Dict[str, Any]:
+        digest = manifest_hash(jobs)
+
+        run = self.db.find_batch_run(digest) if resume_existing else None
+        if run is not None:
+            return self.resume(run['id'])
+
+        run_id = self.db.create_batch_run(digest, jobs, max_attempts=self.max_attempts)
+        return self.resume(run_id)
+
+    def enqueue_sharded(self, jobs: List[Dict],
+                        template_store: Optional[TemplateStore] = None,
+                        priority: int = 0) -> str:
+        batch_id = manifest_hash(jobs)
+
+        if template_store is not None:
+            template_hashes = {}
+            sharded_jobs = []
+            for job in jobs:
+                template_path = job['template_path']
+                if template_path not in template_hashes:
+                    template_hashes[template_path] = template_store.put(template_path)
+                sharded_jobs.append(dict(job, template_hash=template_hashes[template_path]))
+            jobs = sharded_jobs
+
+        self.db.enqueue_fill_jobs(jobs, batch_id=batch_id, priority=priority,
+                                  max_attempts=self.max_attempts)
+        return batch_id
+
+    def wait_for_batch(self, batch_id: str, poll_interval: float = 1.0,
+                       timeout: Optional[float] = None) -> Dict[str, int]:
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            stats = self.db.get_fill_queue_stats(batch_id=batch_id)
+            if stats['depth'] == 0:
+                return stats
+            if deadline is not None and time.time() >= deadline:
+                return stats
+            time.sleep(poll_interval)
+
+    def resume(self, run_id: int) -> Dict[str, Any]:
+        run = self.db.get_batch_run(run_id)
+        if run is None:
+            raise ValueError(f"Пакетный запуск не найден: {run_id}")
+
+        start_time = time.perf_counter()
+        pending = self.db.get_batch_run_jobs(run_id, max_attempts=run['max_attempts'])
+        results = []
+        processed = 0
+
+        for job in pending:
+            results.append(self._run_job(job))
+            processed += 1
+            if len(results) >= self.checkpoint_every:
+                self.db.checkpoint_batch_run(run_id, results)
+                results = []
+
+        if results:
+            self.db.checkpoint_batch_run(run_id, results)
+
+        status = self.db.finish_batch_run(run_id)
+        run = self.db.get_batch_run(run_id)
+
+        return {
+            'run_id': run_id,
+            'status': status,
+            'total': run['total'],
+            'completed': run['completed'],
+            'failed': run['failed'],
+            'processed': processed,
+            'skipped': run['total'] - len(pending),
+            'duration': time.perf_counter() - start_time
+        }
+
+    def _run_job(self, job: Dict) -> Dict[str, Any]:
+        start_time = time.perf_counter()
+        result = {
+            'job_index': job['job_index'],
+            'template_path': job['template_path'],
+            'output_path': job['output_path']
+        }
+
+        try:
+            output_dir = os.path.dirname(job['output_path'])
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            result['output_path'] = self.filler.fill_document(
+                job['template_path'], job['data'], job['output_path'], job['mapping']
+            )
+            result['status'] = 'completed'
+        except Exception as e:
+            print(f"Error filling {job['template_path']}: {e}")
+            result['status'] = 'failed'
+            result['error'] = str(e)
+
+        result['duration'] = time.perf_counter() - start_time
+        return result
@@ -1,19 +1,47 @@
 import json
+import re
 import sqlite3
 import os
+import time
+from collections import OrderedDict
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 
 
+SEARCH_TOKENIZER = 'unicode61 remove_diacritics 2'
+SEARCH_COLUMNS = {
+    'organizations': ('name', 'full_name', 'inn', 'kpp', 'ogrn', 'address', 'director_name'),
+    'persons': ('full_name', 'position', 'phone', 'email', 'address')
+}
+SEARCH_TITLES = {'organizations': 'name', 'persons': 'full_name', 'data_cards': 'card_name'}
+SEARCH_TERM = re.compile(r'\w+')
+
+
 class DatabaseManager:
     
-    def __init__(self, db_path: str = 'documents_data.db'):
+    ENTITY_TABLES = ('organizations', 'persons', 'data_cards')
+    
+    def __init__(self, db_path: str = 'documents_data.db', timeout: float = 30.0,
+                 entity_cache_size: int = 1024,
+                 history_retention_days: Optional[int] = None,
+                 archive_dir: Optional[str] = None):
         self.db_path = db_path
+        self.timeout = timeout
+        self.history_retention_days = history_retention_days
+        self.archive_dir = archive_dir or os.path.join(
+            os.path.dirname(os.path.abspath(db_path)), 'history_archive')
         self.connection = None
+        self.entity_cache_size = entity_cache_size
+        self._entity_cache: OrderedDict = OrderedDict()
+        self._entity_versions: Dict[str, int] = {}
+        self._data_version = None
+        self.entity_cache_hits = 0
+        self.entity_cache_misses = 0
+        self.entity_cache_invalidations = 0
         self._init_database()
     
     def _init_database(self):
-        self.connection = sqlite3.connect(self.db_path)
+        self.connection = sqlite3.connect(self.db_path, timeout=self.timeout)
         self.connection.row_factory = sqlite3.Row
         cursor = self.connection.cursor()
         
@@ -73,6 +101,27 @@ class DatabaseManager:
             )
         ''')
         
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS entity_versions (
+                kind TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        for table in self.ENTITY_TABLES:
+            cursor.execute('INSERT OR IGNORE INTO entity_versions (kind, version) VALUES (?, 0)',
+                           (table,))
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE entity_versions SET version = version + 1 WHERE kind = '{table}';
+                    END
+                ''')
+        
+        self._init_search_index(cursor)
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS document_history (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -89,8 +138,347 @@ class DatabaseManager:
             )
         ''')
         
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_document_history_created
+            ON document_history (created_at)
+        ''')
+        
+        self._init_history_rollups(cursor)
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fill_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                template_path TEXT NOT NULL,
+                output_path TEXT NOT NULL,
+                data_json TEXT,
+                data_card_id INTEGER,
+                organization_id INTEGER,
+                person_id INTEGER,
+                priority INTEGER DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                max_attempts INTEGER DEFAULT 3,
+                available_at REAL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires_at REAL,
+                last_error TEXT,
+                history_id INTEGER,
+                duration REAL,
+                batch_id TEXT,
+                template_hash TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (data_card_id) REFERENCES data_cards (id),
+                FOREIGN KEY (organization_id) REFERENCES organizations (id),
+                FOREIGN KEY (person_id) REFERENCES persons (id),
+                FOREIGN KEY (history_id) REFERENCES document_history (id)
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_fill_jobs_status
+            ON fill_jobs (status, priority, available_at)
+        ''')
+        
+        self._ensure_columns(cursor, 'fill_jobs', {'batch_id': 'TEXT', 'template_hash': 'TEXT'})
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_fill_jobs_batch
+            ON fill_jobs (batch_id, status)
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS worker_nodes (
+                worker_id TEXT PRIMARY KEY,
+                hostname TEXT,
+                pid INTEGER,
+                status TEXT NOT NULL DEFAULT 'active',
+                jobs_completed INTEGER DEFAULT 0,
+                jobs_failed INTEGER DEFAULT 0,
+                started_at REAL,
+                last_heartbeat REAL
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS batch_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                manifest_hash TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'running',
+                total INTEGER DEFAULT 0,
+                completed INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                max_attempts INTEGER DEFAULT 3,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS batch_run_jobs (
+                run_id INTEGER NOT NULL,
+                job_index INTEGER NOT NULL,
+                template_path TEXT NOT NULL,
+                output_path TEXT NOT NULL,
+                data_json TEXT,
+                mapping_json TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                history_id INTEGER,
+                duration REAL,
+                PRIMARY KEY (run_id, job_index),
+                FOREIGN KEY (run_id) REFERENCES batch_runs (id),
+                FOREIGN KEY (history_id) REFERENCES document_history (id)
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_batch_runs_manifest
+            ON batch_runs (manifest_hash, status)
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS render_cache (
+                render_key TEXT PRIMARY KEY,
+                template_hash TEXT NOT NULL,
+                data_hash TEXT NOT NULL,
+                engine_version TEXT NOT NULL,
+                output_path TEXT NOT NULL,
+                output_hash TEXT NOT NULL,
+                size INTEGER,
+                mtime_ns INTEGER,
+                hits INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
         self.connection.commit()
     
+    def _init_history_rollups(self, cursor):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_daily_stats'")
+        exists = cursor.fetchone() is not None
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS history_daily_stats (
+                day TEXT NOT NULL,
+                template_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, template_path, status)
+            )
+        ''')
+        
+        # Архивация удаляет строки истории, но не уменьшает агрегаты
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS document_history_stats_insert
+            AFTER INSERT ON document_history
+            BEGIN
+                INSERT INTO history_daily_stats (day, template_path, status, count)
+                VALUES (date(new.created_at), new.template_path, COALESCE(new.status, ''), 1)
+                ON CONFLICT (day, template_path, status) DO UPDATE SET count = count + 1;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS document_history_stats_update
+            AFTER UPDATE OF status ON document_history
+            WHEN COALESCE(old.status, '') != COALESCE(new.status, '')
+            BEGIN
+                UPDATE history_daily_stats SET count = count - 1
+                WHERE day = date(old.created_at) AND template_path = old.template_path
+                  AND status = COALESCE(old.status, '');
+                INSERT INTO history_daily_stats (day, template_path, status, count)
+                VALUES (date(new.created_at), new.template_path, COALESCE(new.status, ''), 1)
+                ON CONFLICT (day, template_path, status) DO UPDATE SET count = count + 1;
+            END
+        ''')
+        
+        if not exists:
+            cursor.execute('''
+                INSERT INTO history_daily_stats (day, template_path, status, count)
+                SELECT date(created_at), template_path, COALESCE(status, ''), COUNT(*)
+                FROM document_history
+                GROUP BY date(created_at), template_path, COALESCE(status, '')
+            ''')
+    
+    def _init_search_index(self, cursor):
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%_fts'")
+        existing = {row['name'] for row in cursor.fetchall()}
+        
+        for table, columns in SEARCH_COLUMNS.items():
+            column_list = ', '.join(columns)
+            new_values = ', '.join(f'new.{column}' for column in columns)
+            old_values = ', '.join(f'old.{column}' for column in columns)
+            
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+                    {column_list}, content='{table}', content_rowid='id',
+                    tokenize='{SEARCH_TOKENIZER}', prefix='2 3'
+                )
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table}
+                BEGIN
+                    INSERT INTO {table}_fts (rowid, {column_list}) VALUES (new.id, {new_values});
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table}
+                BEGIN
+                    INSERT INTO {table}_fts ({table}_fts, rowid, {column_list})
+                    VALUES ('delete', old.id, {old_values});
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE ON {table}
+                BEGIN
+                    INSERT INTO {table}_fts ({table}_fts, rowid, {column_list})
+                    VALUES ('delete', old.id, {old_values});
+                    INSERT INTO {table}_fts (rowid, {column_list}) VALUES (new.id, {new_values});
+                END
+            ''')
+            if f'{table}_fts' not in existing:
+                cursor.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+        
+        # Из data_json индексируются только скалярные значения верхнего уровня
+        card_values = '''(SELECT group_concat(value, ' ') FROM json_each({}.data_json)
+                          WHERE type IN ('text', 'integer', 'real'))'''
+        
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS data_cards_fts USING fts5(
+                card_name, card_type, description, data_values,
+                tokenize='{SEARCH_TOKENIZER}', prefix='2 3'
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS data_cards_fts_insert AFTER INSERT ON data_cards
+            BEGIN
+                INSERT INTO data_cards_fts (rowid, card_name, card_type, description, data_values)
+                VALUES (new.id, new.card_name, new.card_type, new.description,
+                        {card_values.format('new')});
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS data_cards_fts_delete AFTER DELETE ON data_cards
+            BEGIN
+                DELETE FROM data_cards_fts WHERE rowid = old.id;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS data_cards_fts_update AFTER UPDATE ON data_cards
+            BEGIN
+                DELETE FROM data_cards_fts WHERE rowid = old.id;
+                INSERT INTO data_cards_fts (rowid, card_name, card_type, description, data_values)
+                VALUES (new.id, new.card_name, new.card_type, new.description,
+                        {card_values.format('new')});
+            END
+        ''')
+        if 'data_cards_fts' not in existing:
+            cursor.execute(f'''
+                INSERT INTO data_cards_fts (rowid, card_name, card_type, description, data_values)
+                SELECT id, card_name, card_type, description, {card_values.format('data_cards')}
+                FROM data_cards
+            ''')
+    
+    def _ensure_columns(self, cursor, table: str, columns: Dict[str, str]):
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row['name'] for row in cursor.fetchall()}
+        for name, column_type in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+    
+    def _sync_entity_cache(self):
+        cursor = self.connection.cursor()
+        data_version = cursor.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+        
+        cursor.execute('SELECT kind, version FROM entity_versions')
+        versions = {row['kind']: row['version'] for row in cursor.fetchall()}
+        stale = {kind for kind, version in versions.items()
+                 if self._entity_versions.get(kind) != version}
+        self._entity_versions = versions
+        
+        if stale:
+            for key in [key for key in self._entity_cache if key[0] in stale]:
+                del self._entity_cache[key]
+                self.entity_cache_invalidations += 1
+    
+    def _cached_entity(self, kind: str, entity_id: int, sync: bool = True) -> Optional[Dict]:
+        if sync:
+            self._sync_entity_cache()
+        
+        key = (kind, entity_id)
+        entry = self._entity_cache.get(key)
+        if entry is not None:
+            self._entity_cache.move_to_end(key)
+            self.entity_cache_hits += 1
+            return entry
+        self.entity_cache_misses += 1
+        
+        cursor = self.connection.cursor()
+        cursor.execute(f'SELECT * FROM {kind} WHERE id = ?', (entity_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        
+        entry = {'row': dict(row), 'projection': None}
+        
+        self._entity_cache[key] = entry
+        while len(self._entity_cache) > self.entity_cache_size:
+            self._entity_cache.popitem(last=False)
+        return entry
+    
+    def _entity_record(self, kind: str, entry: Dict) -> Dict:
+        record = dict(entry['row'])
+        if kind == 'data_cards':
+            # Вложенные списки и словари не должны разделяться с кэшем
+            record['data'] = json.loads(record['data_json'])
+        return record
+    
+    def _entity_projection(self, kind: str, entry: Dict) -> Dict:
+        projection = entry['projection']
+        if projection is not None:
+            return projection
+        
+        row = entry['row']
+        if kind == 'organizations':
+            projection = {f'org_{k}': v for k, v in row.items()}
+            projection['organization'] = row.get('name')
+            projection['organization_full'] = row.get('full_name')
+            projection['inn'] = row.get('inn')
+            projection['kpp'] = row.get('kpp')
+            projection['address'] = row.get('address')
+        else:
+            projection = {f'person_{k}': v for k, v in row.items()}
+            projection['full_name'] = row.get('full_name')
+            projection['position'] = row.get('position')
+        
+        entry['projection'] = projection
+        return projection
+    
+    def _invalidate_entity(self, kind: str, entity_id: Optional[int] = None):
+        if entity_id is None:
+            keys = [key for key in self._entity_cache if key[0] == kind]
+        else:
+            keys = [(kind, entity_id)]
+        for key in keys:
+            if self._entity_cache.pop(key, None) is not None:
+                self.entity_cache_invalidations += 1
+    
+    def get_entity_cache_stats(self) -> Dict[str, Any]:
+        total = self.entity_cache_hits + self.entity_cache_misses
+        return {
+            'entries': len(self._entity_cache),
+            'max_entries': self.entity_cache_size,
+            'hits': self.entity_cache_hits,
+            'misses': self.entity_cache_misses,
+            'invalidations': self.entity_cache_invalidations,
+            'hit_rate': self.entity_cache_hits / total if total else 0.0
+        }
+    
     def add_organization(self, org_data: Dict) -> int:
         cursor = self.connection.cursor()
         
@@ -104,12 +492,9 @@ class DatabaseManager:
         return cursor.lastrowid
     
     def get_organization(self, org_id: int) -> Optional[Dict]:
-        cursor = self.connection.cursor()
-        cursor.execute('SELECT * FROM organizations WHERE id = ?', (org_id,))
-        
-        row = cursor.fetchone()
-        if row:
-            return dict(row)
+        entry = self._cached_entity('organizations', org_id)
+        if entry:
+            return dict(entry['row'])
         return None
     
     def get_all_organizations(self) -> List[Dict]:
@@ -126,6 +511,7 @@ class DatabaseManager:
         
         cursor.execute(query, list(org_data.values()) + [org_id])
         self.connection.commit()
+        self._invalidate_entity('organizations', org_id)
         
         return cursor.rowcount > 0
     
@@ -142,12 +528,9 @@ class DatabaseManager:
         return cursor.lastrowid
     
     def get_person(self, person_id: int) -> Optional[Dict]:
-        cursor = self.connection.cursor()
-        cursor.execute('SELECT * FROM persons WHERE id = ?', (person_id,))
-        
-        row = cursor.fetchone()
-        if row:
-            return dict(row)
+        entry = self._cached_entity('persons', person_id)
+        if entry:
+            return dict(entry['row'])
         return None
     
     def get_all_persons(self) -> List[Dict]:
@@ -171,14 +554,9 @@ class DatabaseManager:
         return cursor.lastrowid
     
     def get_data_card(self, card_id: int) -> Optional[Dict]:
-        cursor = self.connection.cursor()
-        cursor.execute('SELECT * FROM data_cards WHERE id = ?', (card_id,))
-        
-        row = cursor.fetchone()
-        if row:
-            result = dict(row)
-            result['data'] = json.loads(result['data_json'])
-            return result
+        entry = self._cached_entity('data_cards', card_id)
+        if entry:
+            return self._entity_record('data_cards', entry)
         return None
     
     def get_data_card_by_name(self, card_name: str) -> Optional[Dict]:
@@ -204,6 +582,45 @@ class DatabaseManager:
         
         return cards
     
+    def search(self, query: str, kinds: Optional[List[str]] = None,
+               limit: int = 20, offset: int = 0) -> List[Dict]:
+        terms = SEARCH_TERM.findall(query)
+        if not terms:
+            return []
+        match = ' '.join(f'"{term}"*' for term in terms)
+        
+        kinds = list(kinds) if kinds else list(self.ENTITY_TABLES)
+        unknown = [kind for kind in kinds if kind not in self.ENTITY_TABLES]
+        if unknown:
+            raise ValueError(f"Неизвестный тип записей для поиска: {', '.join(unknown)}")
+        
+        selects = [f"SELECT * FROM (SELECT '{kind}' AS kind, rowid AS id, rank "
+                   f"FROM {kind}_fts WHERE {kind}_fts MATCH ? ORDER BY rank LIMIT ?)"
+                   for kind in kinds]
+        cursor = self.connection.cursor()
+        cursor.execute(f'''
+            SELECT kind, id, rank FROM ({' UNION ALL '.join(selects)})
+            ORDER BY rank, kind, id
+            LIMIT ? OFFSET ?
+        ''', [match, limit + offset] * len(kinds) + [limit, offset])
+        
+        results = []
+        self._sync_entity_cache()
+        for row in cursor.fetchall():
+            entry = self._cached_entity(row['kind'], row['id'], sync=False)
+            if entry is None:
+                continue
+            record = self._entity_record(row['kind'], entry)
+            results.append({
+                'kind': row['kind'],
+                'id': row['id'],
+                'rank': row['rank'],
+                'title': record.get(SEARCH_TITLES[row['kind']]),
+                'record': record
+            })
+        
+        return results
+    
     def add_document_history(self, template_path: str, output_path: str,
                            data_card_id: Optional[int] = None,
                            organization_id: Optional[int] = None,
@@ -230,38 +647,590 @@ class DatabaseManager:
         
         return [dict(row) for row in cursor.fetchall()]
     
+    def _archive_path(self, month: str) -> str:
+        return os.path.join(self.archive_dir, f"history_{month.replace('-', '_')}.db")
+    
+    def archive_document_history(self, retention_days: Optional[int] = None) -> Dict[str, int]:
+        retention_days = retention_days if retention_days is not None else self.history_retention_days
+        if retention_days is None:
+            return {}
+        
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT datetime('now', ?)", (f'-{int(retention_days)} days',))
+        cutoff = cursor.fetchone()[0]
+        
+        cursor.execute('''
+            SELECT DISTINCT strftime('%Y-%m', created_at) AS month
+            FROM document_history
+            WHERE created_at < ?
+            ORDER BY month
+        ''', (cutoff,))
+        months = [row['month'] for row in cursor.fetchall()]
+        if not months:
+            return {}
+        
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self.connection.commit()
+        
+        archived = {}
+        for month in months:
+            cursor.execute('ATTACH DATABASE ? AS history_archive', (self._archive_path(month),))
+            try:
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS history_archive.document_history (
+                        id INTEGER PRIMARY KEY,
+                        template_path TEXT NOT NULL,
+                        output_path TEXT NOT NULL,
+                        data_card_id INTEGER,
+                        organization_id INTEGER,
+                        person_id INTEGER,
+                        status TEXT,
+                        created_at TIMESTAMP
+                    )
+                ''')
+                cursor.execute('''
+                    INSERT OR IGNORE INTO history_archive.document_history
+                    (id, template_path, output_path, data_card_id, organization_id,
+                     person_id, status, created_at)
+                    SELECT id, template_path, output_path, data_card_id, organization_id,
+                           person_id, status, created_at
+                    FROM main.document_history
+                    WHERE created_at < ? AND strftime('%Y-%m', created_at) = ?
+                ''', (cutoff, month))
+                cursor.execute('''
+                    DELETE FROM main.document_history
+                    WHERE created_at < ? AND strftime('%Y-%m', created_at) = ?
+                ''', (cutoff, month))
+                archived[month] = cursor.rowcount
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+            finally:
+                cursor.execute('DETACH DATABASE history_archive')
+        
+        return archived
+    
+    def get_history_archives(self) -> List[str]:
+        if not os.path.isdir(self.archive_dir):
+            return []
+        return sorted(name[len('history_'):-len('.db')].replace('_', '-')
+                      for name in os.listdir(self.archive_dir)
+                      if name.startswith('history_') and name.endswith('.db'))
+    
+    def get_archived_document_history(self, month: str, limit: int = 50) -> List[Dict]:
+        path = self._archive_path(month)
+        if not os.path.exists(path):
+            return []
+        
+        with sqlite3.connect(path) as archive:
+            archive.row_factory = sqlite3.Row
+            cursor = archive.execute('''
+                SELECT * FROM document_history
+                ORDER BY created_at DESC
+                LIMIT ?
+            ''', (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_history_stats(self, start_day: Optional[str] = None,
+                          end_day: Optional[str] = None,
+                          template_path: Optional[str] = None,
+                          group_by: str = 'day') -> List[Dict]:
+        columns = {'day': 'day', 'template': 'template_path', 'day_template': 'day, template_path'}
+        if group_by not in columns:
+            raise ValueError(f"Неподдерживаемая группировка: {group_by}")
+        
+        conditions = []
+        params = []
+        if start_day:
+            conditions.append('day >= ?')
+            params.append(start_day)
+        if end_day:
+            conditions.append('day <= ?')
+            params.append(end_day)
+        if template_path:
+            conditions.append('template_path = ?')
+            params.append(template_path)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        cursor = self.connection.cursor()
+        cursor.execute(f'''
+            SELECT {columns[group_by]}, status, SUM(count) AS count
+            FROM history_daily_stats
+            {where}
+            GROUP BY {columns[group_by]}, status
+            ORDER BY {columns[group_by]}
+        ''', params)
+        
+        stats = {}
+        for row in cursor.fetchall():
+            row = dict(row)
+            count = row.pop('count')
+            status = row.pop('status')
+            key = tuple(row.values())
+            entry = stats.setdefault(key, dict(row, total=0, statuses={}))
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + count
+            entry['total'] += count
+        
+        for entry in stats.values():
+            failed = entry['statuses'].get('failed', 0)
+            entry['failure_rate'] = failed / entry['total'] if entry['total'] else 0.0
+        
+        return list(stats.values())
+    
     def get_complete_data_for_document(self, organization_id: Optional[int] = None,
                                       person_id: Optional[int] = None,
                                       data_card_id: Optional[int] = None) -> Dict:
         result = {}
+        self._sync_entity_cache()
         
         if organization_id:
-            org_data = self.get_organization(organization_id)
-            if org_data:
-                result.update({f'org_{k}': v for k, v in org_data.items()})
-                result['organization'] = org_data.get('name')
-                result['organization_full'] = org_data.get('full_name')
-                result['inn'] = org_data.get('inn')
-                result['kpp'] = org_data.get('kpp')
-                result['address'] = org_data.get('address')
+            entry = self._cached_entity('organizations', organization_id, sync=False)
+            if entry:
+                result.update(self._entity_projection('organizations', entry))
         
         if person_id:
-            person_data = self.get_person(person_id)
-            if person_data:
-                result.update({f'person_{k}': v for k, v in person_data.items()})
-                result['full_name'] = person_data.get('full_name')
-                result['position'] = person_data.get('position')
+            entry = self._cached_entity('persons', person_id, sync=False)
+            if entry:
+                result.update(self._entity_projection('persons', entry))
         
         if data_card_id:
-            card = self.get_data_card(data_card_id)
-            if card:
-                result.update(card['data'])
+            entry = self._cached_entity('data_cards', data_card_id, sync=False)
+            if entry:
+                result.update(json.loads(entry['row']['data_json']))
         
         result['date'] = datetime.now().strftime('%d.%m.%Y')
         result['current_date'] = datetime.now()
         
         return result
     
+    def enqueue_fill_job(self, template_path: str, output_path: str,
+                         data: Optional[Dict] = None,
+                         data_card_id: Optional[int] = None,
+                         organization_id: Optional[int] = None,
+                         person_id: Optional[int] = None,
+                         priority: int = 0,
+                         max_attempts: int = 3,
+                         template_hash: Optional[str] = None,
+                         batch_id: Optional[str] = None) -> int:
+        cursor = self.connection.cursor()
+        
+        data_json = json.dumps(data, ensure_ascii=False, default=str) if data is not None else None
+        
+        cursor.execute('''
+            INSERT INTO fill_jobs
+            (template_path, output_path, data_json, data_card_id, organization_id,
+             person_id, priority, max_attempts, available_at, template_hash, batch_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (template_path, output_path, data_json, data_card_id, organization_id,
+              person_id, priority, max_attempts, time.time(), template_hash, batch_id))
+        
+        self.connection.commit()
+        return cursor.lastrowid
+    
+    def enqueue_fill_jobs(self, jobs: List[Dict], batch_id: Optional[str] = None,
+                          priority: int = 0, max_attempts: int = 3) -> int:
+        cursor = self.connection.cursor()
+        now = time.time()
+        
+        try:
+            cursor.executemany('''
+                INSERT INTO fill_jobs
+                (template_path, output_path, data_json, data_card_id, organization_id,
+                 person_id, priority, max_attempts, available_at, template_hash, batch_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', ((job['template_path'], job['output_path'],
+                   json.dumps(job['data'], ensure_ascii=False, default=str)
+                   if job.get('data') is not None else None,
+                   job.get('data_card_id'), job.get('organization_id'), job.get('person_id'),
+                   job.get('priority', priority), max_attempts, now,
+                   job.get('template_hash'), batch_id)
+                  for job in jobs))
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        
+        return cursor.rowcount
+    
+    def claim_fill_job(self, worker_id: str, lease_seconds: float = 300) -> Optional[Dict]:
+        now = time.time()
+        cursor = self.connection.cursor()
+        
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            
+            self._fail_expired_fill_jobs(cursor, now)
+            
+            cursor.execute('''
+                SELECT * FROM fill_jobs
+                WHERE (status = 'pending' AND available_at <= ?)
+                   OR (status = 'running' AND lease_expires_at < ?)
+                ORDER BY priority DESC, id
+                LIMIT 1
+            ''', (now, now))
+            
+            row = cursor.fetchone()
+            if row is None:
+                self.connection.commit()
+                return None
+            
+            cursor.execute('''
+                UPDATE fill_jobs
+                SET status = 'running', attempts = attempts + 1,
+                    lease_owner = ?, lease_expires_at = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (worker_id, now + lease_seconds, row['id']))
+            
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        
+        job = dict(row)
+        job['status'] = 'running'
+        job['attempts'] += 1
+        job['lease_owner'] = worker_id
+        job['lease_expires_at'] = now + lease_seconds
+        job['data'] = json.loads(job['data_json']) if job['data_json'] else None
+        return job
+    
+    def _fail_expired_fill_jobs(self, cursor, now: float) -> int:
+        cursor.execute('''
+            SELECT id FROM fill_jobs
+            WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts
+        ''', (now,))
+        job_ids = [row['id'] for row in cursor.fetchall()]
+        
+        for job_id in job_ids:
+            cursor.execute('''
+                UPDATE fill_jobs
+                SET status = 'failed', lease_owner = NULL, lease_expires_at = NULL,
+                    last_error = COALESCE(last_error, 'lease expired'),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (job_id,))
+            self._add_fill_job_history(cursor, job_id, 'failed')
+        
+        return len(job_ids)
+    
+    def _add_fill_job_history(self, cursor, job_id: int, status: str,
+                              output_path: Optional[str] = None) -> int:
+        cursor.execute('''
+            INSERT INTO document_history
+            (template_path, output_path, data_card_id, organization_id, person_id, status)
+            SELECT template_path, COALESCE(?, output_path), data_card_id, organization_id,
+                   person_id, ?
+            FROM fill_jobs WHERE id = ?
+        ''', (output_path, status, job_id))
+        history_id = cursor.lastrowid
+        cursor.execute('UPDATE fill_jobs SET history_id = ? WHERE id = ?', (history_id, job_id))
+        return history_id
+    
+    def complete_fill_job(self, job_id: int, worker_id: str,
+                          duration: Optional[float] = None,
+                          history_id: Optional[int] = None,
+                          record_history: bool = False,
+                          output_path: Optional[str] = None) -> bool:
+        cursor = self.connection.cursor()
+        
+        try:
+            cursor.execute('''
+                UPDATE fill_jobs
+                SET status = 'completed', lease_owner = NULL, lease_expires_at = NULL,
+                    duration = ?, history_id = ?, last_error = NULL,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND lease_owner = ?
+            ''', (duration, history_id, job_id, worker_id))
+            completed = cursor.rowcount > 0
+            
+            # История пишется только владельцем аренды, в той же транзакции
+            if completed and record_history:
+                self._add_fill_job_history(cursor, job_id, 'completed', output_path)
+            
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        
+        return completed
+    
+    def fail_fill_job(self, job_id: int, worker_id: str, error: str,
+                      retry_delay: float = 0,
+                      history_id: Optional[int] = None,
+                      record_history: bool = False) -> Optional[str]:
+        cursor = self.connection.cursor()
+        
+        try:
+            cursor.execute('''
+                UPDATE fill_jobs
+                SET status = CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END,
+                    available_at = ?, lease_owner = NULL, lease_expires_at = NULL,
+                    last_error = ?, history_id = COALESCE(?, history_id),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND lease_owner = ?
+            ''', (time.time() + retry_delay, error, history_id, job_id, worker_id))
+            
+            status = None
+            if cursor.rowcount > 0:
+                cursor.execute('SELECT status FROM fill_jobs WHERE id = ?', (job_id,))
+                status = cursor.fetchone()['status']
+                if status == 'failed' and record_history:
+                    self._add_fill_job_history(cursor, job_id, 'failed')
+            
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        
+        return status
+    
+    def get_fill_job(self, job_id: int) -> Optional[Dict]:
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT * FROM fill_jobs WHERE id = ?', (job_id,))
+        
+        row = cursor.fetchone()
+        if row:
+            result = dict(row)
+            result['data'] = json.loads(result['data_json']) if result['data_json'] else None
+            return result
+        return None
+    
+    def heartbeat_fill_worker(self, worker_id: str, lease_seconds: float = 300,
+                              hostname: Optional[str] = None, pid: Optional[int] = None,
+                              jobs_completed: int = 0, jobs_failed: int = 0,
+                              status: str = 'active') -> int:
+        now = time.time()
+        cursor = self.connection.cursor()
+        
+        try:
+            cursor.execute('''
+                INSERT INTO worker_nodes
+                (worker_id, hostname, pid, status, jobs_completed, jobs_failed,
+                 started_at, last_heartbeat)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (worker_id) DO UPDATE SET
+                    hostname = excluded.hostname, pid = excluded.pid,
+                    status = excluded.status, jobs_completed = excluded.jobs_completed,
+                    jobs_failed = excluded.jobs_failed, last_heartbeat = excluded.last_heartbeat
+            ''', (worker_id, hostname, pid, status, jobs_completed, jobs_failed, now, now))
+            
+            cursor.execute('''
+                UPDATE fill_jobs
+                SET lease_expires_at = ?
+                WHERE status = 'running' AND lease_owner = ?
+            ''', (now + lease_seconds, worker_id))
+            extended = cursor.rowcount
+            
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        
+        return extended
+    
+    def get_fill_workers(self, active_within: Optional[float] = None) -> List[Dict]:
+        cursor = self.connection.cursor()
+        if active_within is None:
+            cursor.execute('SELECT * FROM worker_nodes ORDER BY worker_id')
+        else:
+            cursor.execute('''
+                SELECT * FROM worker_nodes
+                WHERE status = 'active' AND last_heartbeat >= ?
+                ORDER BY worker_id
+            ''', (time.time() - active_within,))
+        
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def reclaim_expired_fill_jobs(self) -> int:
+        now = time.time()
+        cursor = self.connection.cursor()
+        
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            failed = self._fail_expired_fill_jobs(cursor, now)
+            cursor.execute('''
+                UPDATE fill_jobs
+                SET status = 'pending', last_error = COALESCE(last_error, 'lease expired'),
+                    lease_owner = NULL, lease_expires_at = NULL, available_at = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running' AND lease_expires_at < ?
+            ''', (now, now))
+            reclaimed = cursor.rowcount
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        
+        return failed + reclaimed
+    
+    def get_fill_queue_stats(self, batch_id: Optional[str] = None) -> Dict[str, int]:
+        cursor = self.connection.cursor()
+        if batch_id is None:
+            cursor.execute('SELECT status, COUNT(*) AS count FROM fill_jobs GROUP BY status')
+        else:
+            cursor.execute('''
+                SELECT status, COUNT(*) AS count FROM fill_jobs
+                WHERE batch_id = ?
+                GROUP BY status
+            ''', (batch_id,))
+        
+        stats = {'pending': 0, 'running': 0, 'completed': 0, 'failed': 0}
+        for row in cursor.fetchall():
+            stats[row['status']] = row['count']
+        stats['depth'] = stats['pending'] + stats['running']
+        
+        return stats
+    
+    def create_batch_run(self, manifest_hash: str, jobs: List[Dict],
+                         max_attempts: int = 3) -> int:
+        cursor = self.connection.cursor()
+        
+        try:
+            cursor.execute('''
+                INSERT INTO batch_runs (manifest_hash, total, max_attempts)
+                VALUES (?, ?, ?)
+            ''', (manifest_hash, len(jobs), max_attempts))
+            run_id = cursor.lastrowid
+            
+            cursor.executemany('''
+                INSERT INTO batch_run_jobs
+                (run_id, job_index, template_path, output_path, data_json, mapping_json)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', ((run_id, index, job['template_path'], job['output_path'],
+                   json.dumps(job.get('data'), ensure_ascii=False, default=str),
+                   json.dumps(job['mapping'], ensure_ascii=False) if job.get('mapping') else None)
+                  for index, job in enumerate(jobs)))
+            
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        
+        return run_id
+    
+    def get_batch_run(self, run_id: int) -> Optional[Dict]:
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT * FROM batch_runs WHERE id = ?', (run_id,))
+        
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    
+    def find_batch_run(self, manifest_hash: str) -> Optional[Dict]:
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            SELECT * FROM batch_runs
+            WHERE manifest_hash = ? AND status != 'completed'
+            ORDER BY id DESC
+            LIMIT 1
+        ''', (manifest_hash,))
+        
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    
+    def get_batch_run_jobs(self, run_id: int, max_attempts: Optional[int] = None) -> List[Dict]:
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            SELECT * FROM batch_run_jobs
+            WHERE run_id = ? AND status != 'completed' AND (? IS NULL OR attempts < ?)
+            ORDER BY job_index
+        ''', (run_id, max_attempts, max_attempts))
+        
+        jobs = []
+        for row in cursor.fetchall():
+            job = dict(row)
+            job['data'] = json.loads(job['data_json']) if job['data_json'] else {}
+            job['mapping'] = json.loads(job['mapping_json']) if job['mapping_json'] else None
+            jobs.append(job)
+        
+        return jobs
+    
+    def checkpoint_batch_run(self, run_id: int, results: List[Dict]):
+        cursor = self.connection.cursor()
+        
+        try:
+            for result in results:
+                cursor.execute('''
+                    INSERT INTO document_history (template_path, output_path, status)
+                    VALUES (?, ?, ?)
+                ''', (result['template_path'], result['output_path'], result['status']))
+                
+                cursor.execute('''
+                    UPDATE batch_run_jobs
+                    SET status = ?, attempts = attempts + 1, last_error = ?,
+                        history_id = ?, duration = ?
+                    WHERE run_id = ? AND job_index = ?
+                ''', (result['status'], result.get('error'), cursor.lastrowid,
+                      result.get('duration'), run_id, result['job_index']))
+            
+            cursor.execute('''
+                UPDATE batch_runs
+                SET completed = (SELECT COUNT(*) FROM batch_run_jobs
+                                 WHERE run_id = ? AND status = 'completed'),
+                    failed = (SELECT COUNT(*) FROM batch_run_jobs
+                              WHERE run_id = ? AND status = 'failed'),
+                    status = 'running', updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (run_id, run_id, run_id))
+            
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+    
+    def finish_batch_run(self, run_id: int) -> Optional[str]:
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            UPDATE batch_runs
+            SET status = CASE WHEN completed >= total THEN 'completed' ELSE 'failed' END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (run_id,))
+        self.connection.commit()
+        
+        run = self.get_batch_run(run_id)
+        return run['status'] if run else None
+    
+    def get_render(self, render_key: str) -> Optional[Dict]:
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT * FROM render_cache WHERE render_key = ?', (render_key,))
+        
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    
+    def put_render(self, render_key: str, template_hash: str, data_hash: str,
+                   engine_version: str, output_path: str, output_hash: str,
+                   size: int, mtime_ns: int):
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO render_cache
+            (render_key, template_hash, data_hash, engine_version, output_path,
+             output_hash, size, mtime_ns)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (render_key, template_hash, data_hash, engine_version, output_path,
+              output_hash, size, mtime_ns))
+        self.connection.commit()
+    
+    def touch_render(self, render_key: str):
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            UPDATE render_cache
+            SET hits = hits + 1, last_used_at = CURRENT_TIMESTAMP
+            WHERE render_key = ?
+        ''', (render_key,))
+        self.connection.commit()
+    
+    def delete_renders(self, template_hash: Optional[str] = None) -> int:
+        cursor = self.connection.cursor()
+        if template_hash is None:
+            cursor.execute('DELETE FROM render_cache')
+        else:
+            cursor.execute('DELETE FROM render_cache WHERE template_hash = ?', (template_hash,))
+        self.connection.commit()
+        
+        return cursor.rowcount
+    
     def load_from_json(self, json_path: str) -> Dict:
         with open(json_path, 'r', encoding='utf-8') as f:
             return json.load(f)
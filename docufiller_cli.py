@@ -0,0 +1,336 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from database_manager import DatabaseManager
+from document_filler import DocumentFiller
+from document_processor import DocumentProcessor
+
+PROGRESS_INTERVAL = 0.5
+MAX_REPORTED_FAILURES = 100
+
+_filler: Optional[DocumentFiller] = None
+_filler_options: Dict[str, Any] = {}
+
+
+def _init_worker(options: Dict[str, Any]):
+    global _filler, _filler_options
+    _filler = None
+    _filler_options = options
+
+
+def _get_filler() -> DocumentFiller:
+    global _filler
+    if _filler is None:
+        render_cache = None
+        if _filler_options.get('render_cache_db'):
+            from render_cache import RenderCache
+            render_cache = RenderCache(DatabaseManager(_filler_options['render_cache_db']),
+                                       blob_dir=_filler_options.get('blob_dir'))
+        _filler = DocumentFiller(flatten_forms=_filler_options.get('flatten_forms', False),
+                                 render_cache=render_cache,
+                                 pdf_workers=_filler_options.get('pdf_workers'))
+    return _filler
+
+
+def _fill_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    filler = _get_filler()
+    started = time.perf_counter()
+    result = {'index': job['index'], 'template': job['template_path'], 'output': job['output_path']}
+
+    try:
+        output_dir = os.path.dirname(job['output_path'])
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        filler.fill_document(job['template_path'], job['data'], job['output_path'], job.get('mapping'))
+        result['success'] = True
+    except Exception as e:
+        result['success'] = False
+        result['error'] = str(e)
+
+    result['duration'] = time.perf_counter() - started
+    result['stages'] = dict(filler.last_fill_stats.get('stages') or {})
+    return result
+
+
+def _analyze_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    result = {'index': job['index'], 'template': job['template_path']}
+
+    try:
+        analysis = DocumentProcessor().analyze_document_structure(job['template_path'])
+        result['success'] = True
+        result['format'] = analysis.get('format')
+        result['fields'] = len(analysis.get('fields', []))
+        result['field_types'] = sorted({field['type'] for field in analysis.get('fields', [])})
+    except Exception as e:
+        result['success'] = False
+        result['error'] = str(e)
+
+    result['duration'] = time.perf_counter() - started
+    result['stages'] = {'analyze': result['duration']}
+    return result
+
+
+def load_records(records_path: str) -> List[Dict[str, Any]]:
+    if os.path.splitext(records_path)[1].lower() == '.csv':
+        with open(records_path, 'r', encoding='utf-8-sig', newline='') as f:
+            return [dict(row) for row in csv.DictReader(f)]
+
+    with open(records_path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_card_records(db_path: str, card_ids: List[int],
+                      organization_id: Optional[int] = None,
+                      person_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    with DatabaseManager(db_path) as db:
+        return [db.get_complete_data_for_document(organization_id=organization_id,
+                                                  person_id=person_id,
+                                                  data_card_id=card_id)
+                for card_id in card_ids]
+
+
+def _unique_path(path: str, used: set) -> str:
+    base, ext = os.path.splitext(path)
+    candidate = path
+    counter = 2
+    while os.path.normcase(candidate) in used:
+        candidate = f"{base}_{counter}{ext}"
+        counter += 1
+    used.add(os.path.normcase(candidate))
+    return candidate
+
+
+def build_jobs(templates: List[str], records: List[Dict[str, Any]], output_dir: str,
+               name_field: Optional[str] = None) -> List[Dict[str, Any]]:
+    jobs = []
+    used = set()
+    for record_idx, record in enumerate(records):
+        stem = str(record.get(name_field)) if name_field and record.get(name_field) else f'{record_idx:06d}'
+        stem = ''.join(ch if ch.isalnum() or ch in '-_.' else '_' for ch in stem)
+        for template_path in templates:
+            base, ext = os.path.splitext(os.path.basename(template_path))
+            if ext.lower() == '.doc':
+                ext = '.docx'
+            jobs.append({
+                'index': len(jobs),
+                'template_path': template_path,
+                'output_path': _unique_path(os.path.join(output_dir, f'{stem}_{base}{ext}'), used),
+                'data': record
+            })
+    return jobs
+
+
+class ProgressReporter:
+
+    def __init__(self, total: int, stream=None, enabled: bool = True):
+        self.total = total
+        self.stream = stream if stream is not None else sys.stderr
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.done = 0
+        self.failed = 0
+        self._last_report = 0.0
+
+    def update(self, result: Dict[str, Any]):
+        self.done += 1
+        if not result.get('success'):
+            self.failed += 1
+
+        now = time.perf_counter()
+        if self.enabled and (now - self._last_report >= PROGRESS_INTERVAL or self.done == self.total):
+            self._last_report = now
+            elapsed = now - self.started
+            rate = self.done / elapsed if elapsed > 0 else 0.0
+            eta = (self.total - self.done) / rate if rate > 0 else 0.0
+            self.stream.write(f'\r{self.done}/{self.total} documents, {rate:.1f} docs/s, '
+                              f'ETA {eta:.0f}s, failed {self.failed}')
+            if self.done == self.total:
+                self.stream.write('\n')
+            self.stream.flush()
+
+
+def run_jobs(func, jobs: List[Dict[str, Any]], workers: int = 1,
+             options: Optional[Dict[str, Any]] = None,
+             progress: bool = True) -> Iterable[Dict[str, Any]]:
+    reporter = ProgressReporter(len(jobs), enabled=progress)
+
+    if workers <= 1 or len(jobs) <= 1:
+        _init_worker(options or {})
+        for job in jobs:
+            result = func(job)
+            reporter.update(result)
+            yield result
+        return
+
+    # Каждый процесс уже занимает ядро, вложенные пулы страниц и OCR только множат процессы
+    options = dict(options or {}, pdf_workers=1)
+    chunksize = max(1, min(64, len(jobs) // (workers * 8)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(options,)) as executor:
+        for result in executor.map(func, jobs, chunksize=chunksize):
+            reporter.update(result)
+            yield result
+
+
+def summarize(command: str, results: List[Dict[str, Any]], duration: float,
+              workers: int) -> Dict[str, Any]:
+    stages = {}
+    for result in results:
+        for stage, elapsed in result.get('stages', {}).items():
+            entry = stages.setdefault(stage, {'total': 0.0, 'max': 0.0, 'count': 0})
+            entry['total'] += elapsed
+            entry['max'] = max(entry['max'], elapsed)
+            entry['count'] += 1
+    for entry in stages.values():
+        entry['mean'] = entry['total'] / entry['count']
+
+    failures = [{'index': r['index'], 'template': r['template'], 'error': r.get('error')}
+                for r in results if not r.get('success')]
+    completed = len(results) - len(failures)
+
+    return {
+        'command': command,
+        'total': len(results),
+        'completed': completed,
+        'failed': len(failures),
+        'workers': workers,
+        'duration': duration,
+        'throughput': completed / duration if duration > 0 else 0.0,
+        'stages': stages,
+        'failures': failures[:MAX_REPORTED_FAILURES]
+    }
+
+
+def _write_summary(summary: Dict[str, Any], summary_path: Optional[str]):
+    text = json.dumps(summary, ensure_ascii=False, indent=2, default=str)
+    if summary_path:
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+def _filler_options_from_args(args) -> Dict[str, Any]:
+    return {
+        'flatten_forms': args.flatten_forms,
+        'render_cache_db': args.render_cache_db,
+        'blob_dir': args.blob_dir
+    }
+
+
+def cmd_fill(args) -> int:
+    with open(args.data, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    mapping = None
+    if args.mapping:
+        with open(args.mapping, 'r', encoding='utf-8') as f:
+            mapping = json.load(f)
+
+    job = {'index': 0, 'template_path': args.template, 'output_path': args.output,
+           'data': data, 'mapping': mapping}
+    started = time.perf_counter()
+    results = list(run_jobs(_fill_job, [job], options=_filler_options_from_args(args),
+                            progress=False))
+    summary = summarize('fill', results, time.perf_counter() - started, 1)
+    _write_summary(summary, args.summary)
+    return 0 if summary['failed'] == 0 else 1
+
+
+def cmd_batch(args) -> int:
+    if args.records:
+        records = load_records(args.records)
+    else:
+        card_ids = [int(card_id) for card_id in args.card_ids.split(',') if card_id.strip()]
+        records = load_card_records(args.db, card_ids, args.organization_id, args.person_id)
+
+    jobs = build_jobs(args.template, records, args.output_dir, args.name_field)
+
+    if args.dry_run:
+        from dry_run import validate_batch
+        summary = validate_batch(jobs, args.dry_run,
+                                 filler=DocumentFiller(flatten_forms=args.flatten_forms))
+        _write_summary(dict(summary, command='batch --dry-run'), args.summary)
+        return 0
+
+    started = time.perf_counter()
+    results = list(run_jobs(_fill_job, jobs, workers=args.jobs,
+                            options=_filler_options_from_args(args),
+                            progress=not args.quiet))
+    summary = summarize('batch', results, time.perf_counter() - started, args.jobs)
+    _write_summary(summary, args.summary)
+    return 0 if summary['failed'] == 0 else 1
+
+
+def cmd_analyze(args) -> int:
+    jobs = [{'index': idx, 'template_path': template_path}
+            for idx, template_path in enumerate(args.templates)]
+
+    started = time.perf_counter()
+    results = list(run_jobs(_analyze_job, jobs, workers=args.jobs, progress=not args.quiet))
+    summary = summarize('analyze', results, time.perf_counter() - started, args.jobs)
+    summary['templates'] = [{key: r.get(key) for key in ('template', 'format', 'fields', 'field_types')}
+                            for r in results if r.get('success')]
+    _write_summary(summary, args.summary)
+    return 0 if summary['failed'] == 0 else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='docufiller', description='DocuFiller command line')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(subparser, parallel: bool = True, fill_options: bool = True):
+        subparser.add_argument('--summary', help='write the JSON summary to this file instead of stdout')
+        if parallel:
+            subparser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                                   help='number of worker processes')
+            subparser.add_argument('--quiet', action='store_true', help='do not print progress')
+        if fill_options:
+            subparser.add_argument('--flatten-forms', action='store_true')
+            subparser.add_argument('--render-cache-db')
+            subparser.add_argument('--blob-dir')
+
+    fill = subparsers.add_parser('fill', help='fill one template with one record')
+    fill.add_argument('template')
+    fill.add_argument('--data', required=True, help='JSON file with the record')
+    fill.add_argument('--output', required=True)
+    fill.add_argument('--mapping', help='JSON file with an explicit field mapping')
+    add_common(fill, parallel=False)
+    fill.set_defaults(func=cmd_fill)
+
+    batch = subparsers.add_parser('batch', help='fill templates for every record')
+    batch.add_argument('--template', action='append', required=True)
+    source = batch.add_mutually_exclusive_group(required=True)
+    source.add_argument('--records', help='JSONL or CSV file with one record per line')
+    source.add_argument('--card-ids', help='comma-separated data card ids from the database')
+    batch.add_argument('--db', default='documents_data.db')
+    batch.add_argument('--organization-id', type=int)
+    batch.add_argument('--person-id', type=int)
+    batch.add_argument('--output-dir', required=True)
+    batch.add_argument('--name-field', help='record field used to name output files')
+    batch.add_argument('--dry-run', metavar='REPORT',
+                       help='validate mappings into a JSONL/CSV report without rendering')
+    add_common(batch)
+    batch.set_defaults(func=cmd_batch)
+
+    analyze = subparsers.add_parser('analyze', help='analyze template structure')
+    analyze.add_argument('templates', nargs='+')
+    add_common(analyze, fill_options=False)
+    analyze.set_defaults(func=cmd_analyze)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,8 @@
 import os
 import re
+import copy
+import time
+from contextlib import contextmanager
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from docx import Document
@@ -19,16 +22,68 @@ import pythoncom
 from pathlib import Path
 
 from field_detector import FieldDetector
+from template_cache import TemplateCache
+from docx_walker import iter_text_units
+from render_cache import RenderCache, canonical_data_hash
 import pymupdf as fitz
 
+REPEATING_PLACEHOLDER = re.compile(r'\{\{([a-zA-Zа-яА-Я0-9_]+)\.([a-zA-Zа-яА-Я0-9_]+)\}\}')
+BRACKET_FIELD_TYPES = ('double_braces', 'single_braces', 'square_brackets', 'angle_brackets')
+
 
 class DocumentFiller:
     
-    def __init__(self):
-        self.field_detector = FieldDetector()
+    def __init__(self, template_cache: Optional[TemplateCache] = None,
+                 flatten_forms: bool = False,
+                 render_cache: Optional[RenderCache] = None,
+                 profiler: Optional[Any] = None,
+                 pdf_workers: Optional[int] = None):
+        self.field_detector = FieldDetector(pdf_workers=pdf_workers)
+        self.template_cache = template_cache if template_cache is not None else TemplateCache()
+        self.flatten_forms = flatten_forms
+        self.render_cache = render_cache
+        self.profiler = profiler
+        self.last_fill_stats: Dict[str, Any] = {}
+    
+    @contextmanager
+    def _stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stages = self.last_fill_stats.setdefault('stages', {})
+            stages[name] = stages.get(name, 0.0) + time.perf_counter() - started
     
     def fill_document(self, template_path: str, data: Dict, 
                      output_path: str, mapping: Optional[Dict] = None) -> str:
+        self.last_fill_stats = {'template_path': template_path, 'stages': {},
+                                'fields': None, 'filled': None}
+        if self.profiler is not None:
+            return self.profiler.run(self, template_path, data, output_path, mapping)
+        return self._fill_document(template_path, data, output_path, mapping)
+    
+    def _fill_document(self, template_path: str, data: Dict,
+                       output_path: str, mapping: Optional[Dict] = None) -> str:
+        if self.render_cache is None or not isinstance(output_path, (str, os.PathLike)):
+            return self._render_document(template_path, data, output_path, mapping)
+        
+        with self._stage('cache'):
+            template_hash = self.template_cache.get(template_path)['content_hash']
+            data_hash = canonical_data_hash(data, mapping, {'flatten_forms': self.flatten_forms})
+            render_key = self.render_cache.render_key(template_hash, data_hash)
+            
+            if self.render_cache.reuse(render_key, output_path):
+                return output_path
+            
+            self.render_cache.prepare_output(output_path)
+        
+        filled_path = self._render_document(template_path, data, output_path, mapping)
+        with self._stage('cache'):
+            self.render_cache.store(render_key, template_hash, data_hash, filled_path)
+        return filled_path
+    
+    def _render_document(self, template_path: str, data: Dict,
+                         output_path: str, mapping: Optional[Dict] = None) -> str:
         _, ext = os.path.splitext(template_path)
         ext = ext.lower()
         
@@ -67,42 +122,49 @@ class DocumentFiller:
     
     def _fill_docx(self, template_path: str, data: Dict, 
                    output_path: str, mapping: Optional[Dict] = None) -> str:
-        doc = Document(template_path)
-        
-        detected_fields = self.field_detector.detect_fields_in_docx(doc)
+        with self._stage('load'):
+            template = self.template_cache.get(template_path)
+        with self._stage('detect'):
+            detected_fields = self.template_cache.get_artifact(
+                template, 'docx_fields',
+                lambda entry: self.field_detector.detect_fields_in_docx(Document(io.BytesIO(entry['content'])))
+            )
+        with self._stage('load'):
+            doc = Document(io.BytesIO(template['content']))
         
-        field_mappings = self.field_detector.smart_field_mapping(detected_fields, data)
+        with self._stage('map'):
+            field_mappings = self.field_detector.smart_field_mapping(detected_fields, data)
         
-        for para_idx, para in enumerate(doc.paragraphs):
-            self._fill_paragraph(para, para_idx, field_mappings, data)
+        fields_by_key = {}
+        for field_info, value in field_mappings:
+            if value is not None:
+                fields_by_key.setdefault(field_info['key'], []).append((field_info, value))
+        self.last_fill_stats['fields'] = len(detected_fields)
+        self.last_fill_stats['filled'] = sum(len(fields) for fields in fields_by_key.values())
         
-        for table_idx, table in enumerate(doc.tables):
-            self._fill_table(table, table_idx, field_mappings, data)
+        with self._stage('render'):
+            if fields_by_key:
+                for unit in iter_text_units(doc):
+                    unit_fields = fields_by_key.get(unit.key)
+                    if unit_fields:
+                        self._fill_runs(unit.paragraph, unit_fields)
+            
+            self._expand_repeating_rows(doc, data)
         
-        doc.save(output_path)
+        with self._stage('save'):
+            doc.save(output_path)
         return output_path
     
-    def _fill_paragraph(self, para, para_idx: int, 
-                       field_mappings: List, data: Dict):
-        para_fields = [fm for fm in field_mappings 
-                       if fm[0].get('location') == 'paragraph' 
-                       and fm[0].get('paragraph_index') == para_idx]
-        
-        if not para_fields:
-            return
-        
+    def _fill_runs(self, para, unit_fields: List):
         # Сортируем поля по позиции, начиная с конца, чтобы избежать сдвигов
-        para_fields.sort(key=lambda x: x[0]['start'], reverse=True)
+        unit_fields.sort(key=lambda x: x[0]['start'], reverse=True)
         
-        for field_info, value in para_fields:
-            if value is None:
-                continue
-                
+        for field_info, value in unit_fields:
             formatted_value = self._format_value(value, field_info)
             
             # Находим run, содержащий поле
             current_pos = 0
-            for run_idx, run in enumerate(para.runs):
+            for run in para.runs:
                 run_text = run.text
                 run_len = len(run_text)
                 
@@ -119,85 +181,280 @@ class DocumentFiller:
                 
                 current_pos += run_len
     
-    def _fill_table(self, table, table_idx: int, 
-                    field_mappings: List, data: Dict):
-        for row_idx, row in enumerate(table.rows):
-            for cell_idx, cell in enumerate(row.cells):
-                self._fill_cell(cell, table_idx, row_idx, cell_idx, 
-                              field_mappings, data)
+    def _expand_repeating_rows(self, doc, data: Dict):
+        text_tag = qn('w:t')
+        
+        for tr in list(doc.element.body.iter(qn('w:tr'))):
+            parent = tr.getparent()
+            if parent is None:
+                continue
+            
+            match = REPEATING_PLACEHOLDER.search(''.join(t.text or '' for t in tr.iter(text_tag)))
+            if not match:
+                continue
+            
+            list_key = match.group(1)
+            items = data.get(list_key)
+            if not isinstance(items, (list, tuple)):
+                continue
+            
+            plan = self._compile_row_plan(tr, list_key)
+            clones = []
+            for item in items:
+                clone = copy.deepcopy(tr)
+                clone_texts = list(clone.iter(text_tag))
+                for node_idx, parts in plan:
+                    node = clone_texts[node_idx]
+                    node.text = ''.join(
+                        part if isinstance(part, str)
+                        else self._format_value(self._item_value(item, part[0]), {'field_name': part[0]})
+                        for part in parts
+                    )
+                    node.set(qn('xml:space'), 'preserve')
+                clones.append(clone)
+            
+            row_idx = parent.index(tr)
+            parent[row_idx:row_idx + 1] = clones
     
-    def _fill_cell(self, cell, table_idx: int, row_idx: int, 
-                   cell_idx: int, field_mappings: List, data: Dict):
-        cell_fields = [fm for fm in field_mappings 
-                       if fm[0].get('location') == 'table'
-                       and fm[0].get('table_index') == table_idx
-                       and fm[0].get('row_index') == row_idx
-                       and fm[0].get('cell_index') == cell_idx]
-        
-        if not cell_fields:
-            return
-        
-        # Сортируем поля по позиции, начиная с конца
-        cell_fields.sort(key=lambda x: x[0]['start'], reverse=True)
-        
-        for field_info, value in cell_fields:
-            if value is None:
+    def _compile_row_plan(self, tr, list_key: str) -> List[Tuple[int, List]]:
+        text_tag = qn('w:t')
+        node_index = {node: idx for idx, node in enumerate(tr.iter(text_tag))}
+        plan = []
+        
+        for p in tr.iter(qn('w:p')):
+            nodes = [t for t in p.iter(text_tag) if t in node_index]
+            texts = [t.text or '' for t in nodes]
+            joined = ''.join(texts)
+            matches = [m for m in REPEATING_PLACEHOLDER.finditer(joined) if m.group(1) == list_key]
+            if not matches:
                 continue
-                
-            formatted_value = self._format_value(value, field_info)
             
-            # Предполагаем, что клетка имеет параграфы
-            for para in cell.paragraphs:
-                current_pos = 0
-                for run_idx, run in enumerate(para.runs):
-                    run_text = run.text
-                    run_len = len(run_text)
-                    
-                    if current_pos <= field_info['start'] < current_pos + run_len and \
-                       current_pos <= field_info['end'] <= current_pos + run_len:
-                        
-                        local_start = field_info['start'] - current_pos
-                        local_end = field_info['end'] - current_pos
-                        
-                        # Заменяем текст в существующем run
-                        run.text = run_text[:local_start] + formatted_value + run_text[local_end:]
-                        
+            offsets = []
+            pos = 0
+            for text in texts:
+                offsets.append(pos)
+                pos += len(text)
+            
+            parts_by_node = {i: [] for i in range(len(nodes))}
+            match_idx = 0
+            for i, text in enumerate(texts):
+                node_start = offsets[i]
+                node_end = node_start + len(text)
+                cursor = node_start
+                while match_idx < len(matches) and matches[match_idx].start() < node_end:
+                    m = matches[match_idx]
+                    if m.start() >= cursor:
+                        parts_by_node[i].append(joined[cursor:m.start()])
+                        parts_by_node[i].append((m.group(2),))
+                    cursor = min(m.end(), node_end)
+                    if m.end() > node_end:
                         break
-                    
-                    current_pos += run_len
+                    match_idx += 1
+                if cursor < node_end:
+                    parts_by_node[i].append(joined[cursor:node_end])
+            
+            for i, parts in parts_by_node.items():
+                if parts != [texts[i]]:
+                    plan.append((node_index[nodes[i]], parts))
+        
+        return plan
+    
+    def _item_value(self, item: Any, attr: str) -> Any:
+        if isinstance(item, dict):
+            return item.get(attr)
+        return getattr(item, attr, None)
     
     def _fill_pdf(self, template_path: str, data: Dict, 
                   output_path: str, mapping: Optional[Dict] = None) -> str:
-        detected_fields = self.field_detector.detect_fields_in_pdf(template_path)
-        field_mappings = self.field_detector.smart_field_mapping(detected_fields, data)
+        with self._stage('load'):
+            template = self.template_cache.get(template_path)
+            doc = fitz.open(stream=template['content'], filetype='pdf')
         
-        doc = fitz.open(template_path)
+        if doc.is_form_pdf:
+            with self._stage('render'):
+                self.last_fill_stats['filled'] = self._fill_pdf_form(doc, data, mapping)
+                if self.flatten_forms:
+                    doc.bake()
+            with self._stage('save'):
+                doc.save(output_path, incremental=False)
+                doc.close()
+            return output_path
         
-        for field_info, value in field_mappings:
-            if value is None:
-                continue
+        with self._stage('detect'):
+            detected_fields = self.template_cache.get_artifact(
+                template, 'pdf_fields',
+                lambda entry: self.field_detector.detect_fields_in_pdf(template_path)
+            )
+        with self._stage('map'):
+            field_mappings = self.field_detector.smart_field_mapping(detected_fields, data)
+        
+        insertions = []
+        redacted_pages = set()
+        
+        with self._stage('render'):
+            for field_info, value in field_mappings:
+                if value is None:
+                    continue
+                    
+                formatted_value = self._format_value(value, field_info)
                 
-            formatted_value = self._format_value(value, field_info)
-            
-            page = doc[field_info['page']]
+                page = doc[field_info['page']]
+                bbox = field_info['bbox']
+                
+                # Scanned placeholders are part of the page image: bracketed ones are painted over
+                if field_info.get('source') != 'ocr':
+                    page.add_redact_annot(bbox, fill=False)
+                    redacted_pages.add(page.number)
+                elif field_info.get('type') in BRACKET_FIELD_TYPES:
+                    page.draw_rect(bbox, color=None, fill=(1, 1, 1), overlay=True)
+                
+                insertions.append((page, bbox, formatted_value))
             
-            # Insert text into the bbox
-            bbox = field_info['bbox']
-            fontsize = (bbox[3] - bbox[1]) * 0.8  # Approximate fontsize based on height
+            for page_num in redacted_pages:
+                doc[page_num].apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE)
             
-            page.insert_textbox(
-                bbox, 
-                formatted_value, 
-                fontsize=fontsize, 
-                fontname="helv", 
-                align=0  # left align
-            )
+            for page, bbox, formatted_value in insertions:
+                # Word boxes span ascender to descender; place text on the baseline
+                height = bbox[3] - bbox[1]
+                page.insert_text(
+                    (bbox[0], bbox[3] - height * 0.22),
+                    formatted_value,
+                    fontsize=height * 0.72,
+                    fontname="helv"
+                )
         
-        doc.save(output_path, incremental=False)
-        doc.close()
+        self.last_fill_stats['fields'] = len(detected_fields)
+        self.last_fill_stats['filled'] = len(insertions)
+        
+        with self._stage('save'):
+            doc.save(output_path, incremental=False)
+            doc.close()
         
         return output_path
     
+    def _fill_pdf_form(self, doc, data: Dict, mapping: Optional[Dict] = None) -> int:
+        key_index = self.field_detector.get_key_index(data)
+        filled = 0
+        selected_radios = set()
+        
+        for page in doc:
+            for widget in page.widgets():
+                name = widget.field_name or ''
+                if mapping and name in mapping:
+                    key = mapping[name]
+                else:
+                    match = key_index.match(self._widget_key(name)) if name else None
+                    key = match[0] if match else None
+                
+                if key is None or data.get(key) is None:
+                    continue
+                
+                value = data[key]
+                if widget.field_type == fitz.PDF_WIDGET_TYPE_RADIOBUTTON:
+                    # В группе включается только кнопка, чьё состояние совпадает со значением
+                    if str(value).strip().lower() == str(widget.on_state()).strip().lower():
+                        selected_radios.add(widget.xref)
+                        continue
+                    widget.field_value = False
+                elif widget.field_type == fitz.PDF_WIDGET_TYPE_CHECKBOX:
+                    widget.field_value = widget.on_state() if value else 'Off'
+                    filled += 1 if value else 0
+                else:
+                    widget.field_value = self._format_value(value, {'field_name': key})
+                    filled += 1
+                widget.update()
+        
+        # Выключение кнопки сбрасывает значение группы, поэтому выбранные включаются последними
+        if selected_radios:
+            for page in doc:
+                for widget in page.widgets(types=[fitz.PDF_WIDGET_TYPE_RADIOBUTTON]):
+                    if widget.xref in selected_radios:
+                        widget.field_value = True
+                        widget.update()
+                        filled += 1
+        
+        return filled
+    
+    def validate_document(self, template_path: str, data: Dict,
+                          mapping: Optional[Dict] = None,
+                          low_confidence: float = 0.8) -> Dict[str, Any]:
+        ext = os.path.splitext(template_path)[1].lower()
+        template = self.template_cache.get(template_path)
+        key_index = self.field_detector.get_key_index(data)
+        checks = []
+        
+        if ext == '.docx':
+            detected_fields = self.template_cache.get_artifact(
+                template, 'docx_fields',
+                lambda entry: self.field_detector.detect_fields_in_docx(Document(io.BytesIO(entry['content'])))
+            )
+        elif ext == '.pdf':
+            widget_names = self.template_cache.get_artifact(template, 'pdf_form_widgets', self._widget_names)
+            if widget_names is not None:
+                for name in widget_names:
+                    if mapping and name in mapping:
+                        key, score = mapping[name], None
+                    else:
+                        match = key_index.match(self._widget_key(name)) if name else None
+                        key, score = match if match else (None, None)
+                    checks.append((name or None, key, score, data.get(key) if key else None))
+            detected_fields = None if widget_names is not None else self.template_cache.get_artifact(
+                template, 'pdf_fields',
+                lambda entry: self.field_detector.detect_fields_in_pdf(template_path)
+            )
+        else:
+            raise ValueError(f"Проверка без заполнения не поддерживается для формата: {ext}")
+        
+        if detected_fields is not None:
+            # Ключ и оценка берутся из того же сопоставления, что даёт значение
+            for field_info, key, score in self.field_detector.smart_field_keys(detected_fields, data):
+                checks.append((field_info.get('field_name'), key, score,
+                               data[key] if key is not None else None))
+        
+        missing_keys = {}
+        none_values = {}
+        empty_values = {}
+        low_confidence_matches = {}
+        unnamed = 0
+        filled = 0
+        
+        for field_name, key, score, value in checks:
+            if field_name is None:
+                unnamed += 1
+            elif value is None:
+                if key is not None and key in data:
+                    none_values[field_name] = key
+                else:
+                    missing_keys[field_name] = None
+            elif not self._format_value(value, {'field_name': field_name}).strip():
+                empty_values[field_name] = key
+            else:
+                filled += 1
+                if score is not None and score < low_confidence:
+                    low_confidence_matches[field_name] = {'key': key, 'score': round(score, 3)}
+        
+        return {
+            'template': template_path,
+            'fields': len(checks),
+            'filled': filled,
+            'unnamed': unnamed,
+            'missing_keys': list(missing_keys),
+            'none_values': list(none_values),
+            'empty_values': list(empty_values),
+            'low_confidence': [dict(field=name, **match)
+                               for name, match in low_confidence_matches.items()],
+            'ok': not (missing_keys or none_values or empty_values)
+        }
+    
+    def _widget_names(self, entry: Dict[str, Any]) -> Optional[List[str]]:
+        with fitz.open(stream=entry['content'], filetype='pdf') as doc:
+            if not doc.is_form_pdf:
+                return None
+            return [widget.field_name or '' for page in doc for widget in page.widgets()]
+    
+    def _widget_key(self, name: str) -> str:
+        return re.sub(r'\[\d+\]', '', name.split('.')[-1])
+    
     def _format_value(self, value: Any, field_info: Dict) -> str:
         if isinstance(value, datetime):
             return value.strftime('%d.%m.%Y')
@@ -211,15 +468,23 @@ class DocumentFiller:
         return str(value) if value is not None else ''
     
     def fill_multiple(self, template_paths: List[str], data: Dict, 
-                      output_dir: str, mapping: Optional[Dict] = None) -> List[str]:
-        os.makedirs(output_dir, exist_ok=True)
+                      output_dir: Optional[str] = None, mapping: Optional[Dict] = None,
+                      sink: Optional[Any] = None) -> List[str]:
+        if sink is None:
+            os.makedirs(output_dir, exist_ok=True)
         results = []
         
         for template_path in template_paths:
             base_name = os.path.basename(template_path)
-            output_path = os.path.join(output_dir, f"filled_{base_name}")
+            output_name = f"filled_{base_name}"
             try:
-                filled_path = self.fill_document(template_path, data, output_path, mapping)
+                if sink is None:
+                    output_path = os.path.join(output_dir, output_name)
+                    filled_path = self.fill_document(template_path, data, output_path, mapping)
+                else:
+                    buffer = io.BytesIO()
+                    self.fill_document(template_path, data, buffer, mapping)
+                    filled_path = sink.add(output_name, buffer.getvalue())
                 results.append(filled_path)
             except Exception as e:
                 print(f"Error filling {template_path}: {e}")
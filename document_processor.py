@@ -1,6 +1,6 @@
 import os
 import re
-from typing import Dict, List, Tuple, Any, Optional
+from typing import Dict, List, Tuple, Any, Optional, Iterator
 from docx import Document
 from docx.shared import Pt, RGBColor
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
@@ -12,12 +12,21 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 import io
 import json
+import hashlib
 from datetime import datetime
 
+from analysis_cache import AnalysisCache, ANALYSIS_SCHEMA_VERSION
+from pdf_extraction import extract_page_texts, iter_page_texts, get_page_count
+from docx_walker import iter_text_units
+
 
 class DocumentProcessor:
     
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[str] = None,
+                 analysis_cache: Optional[AnalysisCache] = None,
+                 pdf_workers: Optional[int] = None):
+        self.pdf_workers = pdf_workers
+        self.analysis_cache = analysis_cache if analysis_cache is not None else AnalysisCache(cache_dir)
         self.supported_formats = ['.doc', '.docx', '.pdf']
         self.field_patterns = {
             'underscore': r'_{3,}',
@@ -56,16 +65,7 @@ class DocumentProcessor:
             raise Exception(f"Ошибка загрузки PDF: {str(e)}")
     
     def extract_text_from_docx(self, doc: Document) -> str:
-        full_text = []
-        for para in doc.paragraphs:
-            full_text.append(para.text)
-        
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    full_text.append(cell.text)
-        
-        return '\n'.join(full_text)
+        return '\n'.join(unit.paragraph.text for unit in iter_text_units(doc))
     
     def extract_text_from_pdf(self, pdf_reader: PdfReader) -> str:
         text = []
@@ -73,13 +73,36 @@ class DocumentProcessor:
             text.append(page.extract_text())
         return '\n'.join(text)
     
+    def extract_text_from_pdf_file(self, file_path: str, start: int = 0,
+                                   stop: Optional[int] = None) -> str:
+        return '\n'.join(extract_page_texts(file_path, start, stop, self.pdf_workers))
+    
+    def iter_pdf_pages(self, file_path: str, start: int = 0,
+                       stop: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        return iter_page_texts(file_path, start, stop)
+    
+    def _analysis_schema(self) -> str:
+        patterns_json = json.dumps(self.field_patterns, sort_keys=True, ensure_ascii=False)
+        patterns_hash = hashlib.sha256(patterns_json.encode('utf-8')).hexdigest()
+        return f"{ANALYSIS_SCHEMA_VERSION}:{patterns_hash}"
+    
     def analyze_document_structure(self, file_path: str) -> Dict[str, Any]:
         doc_format = self.detect_format(file_path)
         
+        content_hash = self.analysis_cache.content_hash(file_path)
+        schema = self._analysis_schema()
+        
+        cached = self.analysis_cache.get(content_hash, schema)
+        if cached is not None:
+            return cached
+        
         if doc_format in ['.doc', '.docx']:
-            return self._analyze_docx_structure(file_path)
+            result = self._analyze_docx_structure(file_path)
         elif doc_format == '.pdf':
-            return self._analyze_pdf_structure(file_path)
+            result = self._analyze_pdf_structure(file_path)
+        
+        self.analysis_cache.put(content_hash, schema, result)
+        return result
     
     def _analyze_docx_structure(self, file_path: str) -> Dict[str, Any]:
         doc = self._load_docx(file_path)
@@ -107,8 +130,7 @@ class DocumentProcessor:
         }
     
     def _analyze_pdf_structure(self, file_path: str) -> Dict[str, Any]:
-        pdf_reader = self._load_pdf(file_path)
-        text = self.extract_text_from_pdf(pdf_reader)
+        text = self.extract_text_from_pdf_file(file_path)
         
         fields = []
         
@@ -127,5 +149,5 @@ class DocumentProcessor:
             'format': '.pdf',
             'text': text,
             'fields': sorted(fields, key=lambda x: x['position']),
-            'pages_count': len(pdf_reader.pages)
+            'pages_count': get_page_count(file_path)
         }
@@ -0,0 +1,81 @@
+from typing import Iterator, NamedTuple, Optional
+
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+
+P_TAG = qn('w:p')
+TBL_TAG = qn('w:tbl')
+TR_TAG = qn('w:tr')
+TC_TAG = qn('w:tc')
+SDT_TAG = qn('w:sdt')
+SDT_CONTENT_TAG = qn('w:sdtContent')
+
+HEADER_FOOTER_PARTS = (
+    ('header', 'first_page_header'), ('header', 'header'), ('header', 'even_page_header'),
+    ('footer', 'first_page_footer'), ('footer', 'footer'), ('footer', 'even_page_footer')
+)
+
+
+class TextUnit(NamedTuple):
+    key: str
+    paragraph: Paragraph
+    part: str
+    paragraph_index: Optional[int] = None
+    table_index: Optional[int] = None
+    row_index: Optional[int] = None
+    cell_index: Optional[int] = None
+
+
+def _walk_container(element, parent, prefix: str, part: str,
+                    table_address: Optional[tuple] = None) -> Iterator[TextUnit]:
+    para_idx = 0
+    table_idx = 0
+    sdt_idx = 0
+
+    for child in element.iterchildren():
+        tag = child.tag
+        if tag == P_TAG:
+            paragraph = Paragraph(child, parent)
+            if table_address is None:
+                yield TextUnit(f'{prefix}p{para_idx}', paragraph, part, paragraph_index=para_idx)
+            else:
+                table_index, row_index, cell_index = table_address
+                yield TextUnit(f'{prefix}p{para_idx}', paragraph, part, table_index=table_index,
+                               row_index=row_index, cell_index=cell_index)
+            para_idx += 1
+        elif tag == TBL_TAG:
+            yield from _walk_table(child, parent, f'{prefix}t{table_idx}/', part,
+                                   table_idx, table_address)
+            table_idx += 1
+        elif tag == SDT_TAG:
+            content = child.find(SDT_CONTENT_TAG)
+            if content is not None:
+                yield from _walk_container(content, parent, f'{prefix}sdt{sdt_idx}/',
+                                           part, table_address)
+            sdt_idx += 1
+
+
+def _walk_table(tbl, parent, prefix: str, part: str, table_idx: int,
+                table_address: Optional[tuple]) -> Iterator[TextUnit]:
+    # Каждый w:tc посещается ровно один раз, в отличие от row.cells для объединённых ячеек
+    for row_idx, tr in enumerate(tbl.iterchildren(TR_TAG)):
+        for cell_idx, tc in enumerate(tr.iterchildren(TC_TAG)):
+            yield from _walk_container(tc, parent, f'{prefix}r{row_idx}/c{cell_idx}/', part,
+                                       table_address or (table_idx, row_idx, cell_idx))
+
+
+def iter_text_units(doc) -> Iterator[TextUnit]:
+    body = doc._body
+    yield from _walk_container(body._element, body, '', 'body')
+
+    seen_parts = set()
+    for section_idx, section in enumerate(doc.sections):
+        for part, attr in HEADER_FOOTER_PARTS:
+            container = getattr(section, attr)
+            if container.is_linked_to_previous:
+                continue
+            if id(container.part) in seen_parts:
+                continue
+            seen_parts.add(id(container.part))
+            yield from _walk_container(container._element, container,
+                                       f'section{section_idx}/{attr}/', part)
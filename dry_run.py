@@ -0,0 +1,99 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional
+
+from document_filler import DocumentFiller
+
+CSV_COLUMNS = ('record', 'template', 'ok', 'fields', 'filled', 'unnamed', 'missing_keys',
+               'none_values', 'empty_values', 'low_confidence', 'error')
+
+
+class ReportWriter:
+
+    def __init__(self, report_path: str, report_format: Optional[str] = None):
+        self.report_path = report_path
+        self.report_format = report_format or (
+            'csv' if os.path.splitext(report_path)[1].lower() == '.csv' else 'jsonl'
+        )
+        if self.report_format not in ('csv', 'jsonl'):
+            raise ValueError(f"Неподдерживаемый формат отчёта: {self.report_format}")
+
+        self._file = open(report_path, 'w', encoding='utf-8', newline='')
+        self._csv = None
+        if self.report_format == 'csv':
+            self._csv = csv.DictWriter(self._file, fieldnames=CSV_COLUMNS)
+            self._csv.writeheader()
+
+    def write(self, row: Dict[str, Any]):
+        if self._csv is None:
+            self._file.write(json.dumps(row, ensure_ascii=False, default=str))
+            self._file.write('\n')
+            return
+
+        self._csv.writerow({
+            'record': row.get('record'),
+            'template': row.get('template'),
+            'ok': row.get('ok'),
+            'fields': row.get('fields'),
+            'filled': row.get('filled'),
+            'unnamed': row.get('unnamed'),
+            'missing_keys': ';'.join(row.get('missing_keys', [])),
+            'none_values': ';'.join(row.get('none_values', [])),
+            'empty_values': ';'.join(row.get('empty_values', [])),
+            'low_confidence': ';'.join(f"{m['field']}->{m['key']}:{m['score']}"
+                                       for m in row.get('low_confidence', [])),
+            'error': row.get('error', '')
+        })
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def validate_batch(jobs: Iterable[Dict], report_path: str,
+                   filler: Optional[DocumentFiller] = None,
+                   report_format: Optional[str] = None,
+                   low_confidence: float = 0.8) -> Dict[str, Any]:
+    filler = filler if filler is not None else DocumentFiller()
+    start_time = time.perf_counter()
+    records = 0
+    passed = 0
+    errors = 0
+    missing = Counter()
+
+    with ReportWriter(report_path, report_format) as writer:
+        for index, job in enumerate(jobs):
+            records += 1
+            try:
+                row = filler.validate_document(job['template_path'], job.get('data') or {},
+                                               job.get('mapping'), low_confidence)
+            except Exception as e:
+                errors += 1
+                writer.write({'record': index, 'template': job['template_path'],
+                              'ok': False, 'error': str(e)})
+                continue
+
+            if row['ok']:
+                passed += 1
+            missing.update(row['missing_keys'])
+            writer.write(dict(record=index, **row))
+
+    return {
+        'records': records,
+        'ok': passed,
+        'with_issues': records - passed - errors,
+        'errors': errors,
+        'top_missing_keys': missing.most_common(10),
+        'report_path': report_path,
+        'duration': time.perf_counter() - start_time
+    }
@@ -1,16 +1,40 @@
+import hashlib
 import re
-from typing import Dict, List, Tuple, Optional, Any
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Optional, Any, Iterator
 from docx import Document
-from docx.text.paragraph import Paragraph
-from docx.table import Table
 import pymupdf as fitz
 import llm
 import json
 
+from pdf_extraction import run_page_ranges
+from ocr_processor import OCRProcessor, is_image_only_page
+from key_index import KeyIndex, DEFAULT_SYNONYMS
+from keyword_automaton import KeywordAutomaton, KeywordHits
+from pdf_locator import LOCATOR_FLAGS, PageGlyphs, page_lines, match_bbox
+from docx_walker import iter_text_units
+from field_record import (Field, TEXT_LAYOUT, PARAGRAPH_LAYOUT, TABLE_LAYOUT,
+                          PDF_LAYOUT, OCR_LAYOUT)
+
 
 class FieldDetector:
     
-    def __init__(self):
+    def __init__(self, mapping_cache_size: int = 256,
+                 ocr_processor: Optional[OCRProcessor] = None,
+                 mapping_store: Optional[Any] = None,
+                 pdf_workers: Optional[int] = None):
+        self.pdf_workers = pdf_workers
+        self.ocr_processor = (ocr_processor if ocr_processor is not None
+                              else OCRProcessor(workers=pdf_workers))
+        self.mapping_cache_size = mapping_cache_size
+        self.mapping_store = mapping_store
+        self.mapping_cache: OrderedDict = OrderedDict()
+        self.key_index_cache: OrderedDict = OrderedDict()
+        self.synonyms = {key: list(aliases) for key, aliases in DEFAULT_SYNONYMS.items()}
+        self.key_match_threshold = 0.5
+        self._llm_model = None
+        
         self.patterns = {
             'long_underscore': r'_{5,}',
             'medium_underscore': r'_{3,4}',
@@ -35,107 +59,157 @@ class FieldDetector:
             'position_marker': 'position',
             'organization_marker': 'organization',
         }
+        
+        self.context_keywords = {
+            'full_name': ['фио', 'ф.и.о', 'имя'],
+            'date': ['дата', 'число'],
+            'signature': ['подпись'],
+            'position': ['должность'],
+            'organization': ['организация', 'компания'],
+            'address': ['адрес'],
+            'phone': ['телефон', 'тел'],
+            'email': ['email', 'почта'],
+            'inn': ['инн'],
+            'kpp': ['кпп'],
+            'ogrn': ['огрн'],
+            'account_number': ['счет', 'р/с', 'расчетный'],
+            'bank': ['банк', 'бик'],
+            'amount': ['сумма'],
+            'number': ['номер', '№'],
+        }
+        self.context_window = 50
+        self._keyword_automaton = None
+        
+        self.resolve_overlaps = True
+        self.pattern_priorities = {
+            'double_braces': 0,
+            'single_braces': 1,
+            'square_brackets': 2,
+            'angle_brackets': 3,
+            'long_underscore': 4,
+            'medium_underscore': 5,
+            'short_underscore': 6,
+            'dots': 7,
+            'dashes': 8,
+            'fio_marker': 9,
+            'date_marker': 10,
+            'signature_marker': 11,
+            'position_marker': 12,
+            'organization_marker': 13,
+        }
     
-    def detect_fields_in_text(self, text: str) -> List[Dict]:
-        fields = []
+    def add_context_keywords(self, field_name: str, keywords: List[str]):
+        self.context_keywords.setdefault(field_name, []).extend(keywords)
+        self._keyword_automaton = None
+    
+    def _get_keyword_automaton(self) -> KeywordAutomaton:
+        if self._keyword_automaton is None:
+            self._keyword_automaton = KeywordAutomaton(
+                (keyword, field_name)
+                for field_name, keywords in self.context_keywords.items()
+                for keyword in keywords
+            )
+        return self._keyword_automaton
+    
+    def _scan_keywords(self, text: str) -> KeywordHits:
+        return self._get_keyword_automaton().scan(text)
+    
+    def _find_matches(self, text: str) -> List[Tuple[str, Any, Optional[str]]]:
+        candidates = [(pattern_name, match)
+                      for pattern_name, pattern in self.patterns.items()
+                      for match in re.finditer(pattern, text)]
+        if not candidates:
+            return []
+        
+        if self.resolve_overlaps:
+            candidates = self._resolve_overlaps(candidates)
+        
+        keyword_hits = self._scan_keywords(text)
+        return [(pattern_name, match,
+                 self._infer_field_name(pattern_name, match.group(0), text,
+                                        match.start(), keyword_hits))
+                for pattern_name, match in candidates]
+    
+    def _resolve_overlaps(self, candidates: List[Tuple[str, Any]]) -> List[Tuple[str, Any]]:
+        default_priority = len(self.pattern_priorities)
+        ranked = sorted(candidates, key=lambda c: (
+            self.pattern_priorities.get(c[0], default_priority),
+            c[1].start() - c[1].end(),
+            c[1].start()
+        ))
+        
+        starts = []
+        ends = []
+        winners = []
+        for pattern_name, match in ranked:
+            start, end = match.span()
+            idx = bisect_right(starts, start)
+            if idx > 0 and ends[idx - 1] > start:
+                continue
+            if idx < len(starts) and starts[idx] < end:
+                continue
+            starts.insert(idx, start)
+            ends.insert(idx, end)
+            winners.insert(idx, (pattern_name, match))
         
-        for pattern_name, pattern in self.patterns.items():
-            matches = re.finditer(pattern, text)
-            for match in matches:
-                field_info = {
-                    'type': pattern_name,
-                    'start': match.start(),
-                    'end': match.end(),
-                    'text': match.group(0),
-                    'value': match.group(1) if match.groups() else None,
-                    'field_name': self._infer_field_name(pattern_name, match.group(0), text, match.start())
-                }
-                fields.append(field_info)
+        return winners
+    
+    def _get_llm_model(self):
+        if self._llm_model is None:
+            self._llm_model = llm.get_model('gpt-3.5-turbo')
+        return self._llm_model
+    
+    def detect_fields_in_text(self, text: str) -> List[Field]:
+        fields = [Field.from_match(TEXT_LAYOUT, pattern_name, match, text, field_name)
+                  for pattern_name, match, field_name in self._find_matches(text)]
         
         # Enhance with LLM for unnamed fields
-        unnamed = [f for f in fields if not f['field_name']]
+        unnamed = [f for f in fields if not f.field_name]
         if unnamed:
-            contexts = [f"{f['type']}: {f['text']} (context before: {text[max(0,f['start']-50):f['start']]}, after: {text[f['end']:f['end']+50]})" for f in unnamed]
+            contexts = [f"{f.type}: {f.text} (context before: {text[max(0,f.start-50):f.start]}, after: {text[f.end:f.end+50]})" for f in unnamed]
             prompt = f"""Infer field names for these unnamed fields in a document:
 {'; '.join(contexts)}
 
 Output JSON list of field names in order."""
             try:
-                model = llm.get_model('gpt-3.5-turbo')
+                model = self._get_llm_model()
                 response = model.prompt(prompt)
                 inferred_names = json.loads(response.text())
                 for i, name in enumerate(inferred_names):
                     if name:
-                        unnamed[i]['field_name'] = name
+                        unnamed[i].field_name = name
             except Exception as e:
                 print(f"LLM inference failed: {e}. Skipping.")
         
-        return sorted(fields, key=lambda x: x['start'])
-    
-    def detect_fields_in_docx(self, doc: Document) -> List[Dict]:
-        fields = []
-        
-        for para_idx, para in enumerate(doc.paragraphs):
-            para_fields = self._detect_in_paragraph(para, para_idx)
-            fields.extend(para_fields)
-        
-        for table_idx, table in enumerate(doc.tables):
-            table_fields = self._detect_in_table(table, table_idx)
-            fields.extend(table_fields)
-        
-        return fields
-    
-    def _detect_in_paragraph(self, para: Paragraph, para_idx: int) -> List[Dict]:
-        fields = []
-        text = para.text
-        
-        for pattern_name, pattern in self.patterns.items():
-            matches = re.finditer(pattern, text)
-            for match in matches:
-                field_info = {
-                    'type': pattern_name,
-                    'location': 'paragraph',
-                    'paragraph_index': para_idx,
-                    'start': match.start(),
-                    'end': match.end(),
-                    'text': match.group(0),
-                    'value': match.group(1) if match.groups() else None,
-                    'field_name': self._infer_field_name(pattern_name, match.group(0), text, match.start()),
-                    'context': self._get_context(text, match.start(), match.end())
-                }
-                fields.append(field_info)
-        
-        return fields
+        return sorted(fields, key=lambda x: x.start)
     
-    def _detect_in_table(self, table: Table, table_idx: int) -> List[Dict]:
+    def detect_fields_in_docx(self, doc: Document) -> List[Field]:
         fields = []
         
-        for row_idx, row in enumerate(table.rows):
-            for cell_idx, cell in enumerate(row.cells):
-                text = cell.text
-                
-                for pattern_name, pattern in self.patterns.items():
-                    matches = re.finditer(pattern, text)
-                    for match in matches:
-                        field_info = {
-                            'type': pattern_name,
-                            'location': 'table',
-                            'table_index': table_idx,
-                            'row_index': row_idx,
-                            'cell_index': cell_idx,
-                            'start': match.start(),
-                            'end': match.end(),
-                            'text': match.group(0),
-                            'value': match.group(1) if match.groups() else None,
-                            'field_name': self._infer_field_name(pattern_name, match.group(0), text, match.start()),
-                            'context': self._get_context(text, match.start(), match.end())
-                        }
-                        fields.append(field_info)
+        for unit in iter_text_units(doc):
+            text = unit.paragraph.text
+            if not text:
+                continue
+            
+            for pattern_name, match, field_name in self._find_matches(text):
+                if unit.table_index is not None:
+                    fields.append(Field.from_match(
+                        TABLE_LAYOUT, pattern_name, match, text, field_name,
+                        location='table', key=unit.key, table_index=unit.table_index,
+                        row_index=unit.row_index, cell_index=unit.cell_index
+                    ))
+                else:
+                    fields.append(Field.from_match(
+                        PARAGRAPH_LAYOUT, pattern_name, match, text, field_name,
+                        location='paragraph' if unit.part == 'body' else unit.part,
+                        key=unit.key, paragraph_index=unit.paragraph_index
+                    ))
         
         return fields
     
     def _infer_field_name(self, pattern_type: str, matched_text: str, 
-                          full_text: str, position: int) -> Optional[str]:
+                          full_text: str, position: int,
+                          keyword_hits: Optional[KeywordHits] = None) -> Optional[str]:
         
         if pattern_type in self.marker_to_field:
             return self.marker_to_field[pattern_type]
@@ -145,56 +219,39 @@ Output JSON list of field names in order."""
             if match and match.groups():
                 return match.group(1).lower().strip()
         
-        context_before = full_text[max(0, position-50):position].lower()
+        if keyword_hits is None:
+            window_start = max(0, position - self.context_window)
+            keyword_hits = self._scan_keywords(full_text[window_start:position])
+            position -= window_start
         
-        if any(word in context_before for word in ['фио', 'ф.и.о', 'имя']):
-            return 'full_name'
-        elif any(word in context_before for word in ['дата', 'число']):
-            return 'date'
-        elif any(word in context_before for word in ['подпись']):
-            return 'signature'
-        elif any(word in context_before for word in ['должность']):
-            return 'position'
-        elif any(word in context_before for word in ['организация', 'компания']):
-            return 'organization'
-        elif any(word in context_before for word in ['адрес']):
-            return 'address'
-        elif any(word in context_before for word in ['телефон', 'тел']):
-            return 'phone'
-        elif any(word in context_before for word in ['email', 'почта']):
-            return 'email'
-        elif any(word in context_before for word in ['инн']):
-            return 'inn'
-        elif any(word in context_before for word in ['кпп']):
-            return 'kpp'
-        elif any(word in context_before for word in ['огрн']):
-            return 'ogrn'
-        elif any(word in context_before for word in ['счет', 'р/с', 'расчетный']):
-            return 'account_number'
-        elif any(word in context_before for word in ['банк', 'бик']):
-            return 'bank'
-        elif any(word in context_before for word in ['сумма']):
-            return 'amount'
-        elif any(word in context_before for word in ['номер', '№']):
-            return 'number'
-        
-        return None
-    
-    def _get_context(self, text: str, start: int, end: int, 
-                     context_length: int = 30) -> Dict[str, str]:
-        before = text[max(0, start-context_length):start]
-        after = text[end:min(len(text), end+context_length)]
-        
-        return {
-            'before': before.strip(),
-            'after': after.strip()
-        }
+        return keyword_hits.nearest_before(position, self.context_window)
     
     def smart_field_mapping(self, detected_fields: List[Dict], 
                            data: Dict) -> List[Tuple[Dict, Any]]:
+        return [(field, data[key] if key is not None else None)
+                for field, key, _ in self.smart_field_keys(detected_fields, data)]
+    
+    def smart_field_keys(self, detected_fields: List[Dict],
+                         data: Dict) -> List[Tuple[Dict, Optional[str], Optional[float]]]:
         field_names = [f.get('field_name') for f in detected_fields if f.get('field_name')]
         data_keys = list(data.keys())
         
+        cache_key = (tuple(field_names), tuple(data_keys))
+        mapping_dict = self.mapping_cache.get(cache_key)
+        if mapping_dict is not None:
+            self.mapping_cache.move_to_end(cache_key)
+            return self._apply_mapping_keys(detected_fields, data, mapping_dict)
+        
+        store_key = None
+        if self.mapping_store is not None:
+            store_key = hashlib.sha256(
+                json.dumps(cache_key, ensure_ascii=False).encode('utf-8')
+            ).hexdigest()
+            mapping_dict = self.mapping_store.get_mapping(store_key)
+            if mapping_dict is not None:
+                self._remember_mapping(cache_key, mapping_dict)
+                return self._apply_mapping_keys(detected_fields, data, mapping_dict)
+        
         prompt = f"""You are an expert in field mapping for documents.
 Detected fields: {', '.join(field_names)}
 Available data keys: {', '.join(data_keys)}
@@ -203,85 +260,128 @@ Map each detected field to the best matching data key, or null if no good match.
 Output as JSON object where keys are field_names and values are data_keys or null."""
         
         try:
-            model = llm.get_model('gpt-3.5-turbo')
+            model = self._get_llm_model()
             response = model.prompt(prompt)
             mapping_dict = json.loads(response.text())
         except Exception as e:
             print(f"LLM mapping failed: {e}. Falling back to rule-based mapping.")
-            return self._rule_based_mapping(detected_fields, data)
+            return self._rule_based_keys(detected_fields, data)
+        
+        self._remember_mapping(cache_key, mapping_dict)
+        if store_key is not None:
+            self.mapping_store.put_mapping(store_key, mapping_dict)
         
-        mappings = []
+        return self._apply_mapping_keys(detected_fields, data, mapping_dict)
+    
+    def _remember_mapping(self, cache_key: Tuple, mapping_dict: Dict):
+        self.mapping_cache[cache_key] = mapping_dict
+        while len(self.mapping_cache) > self.mapping_cache_size:
+            self.mapping_cache.popitem(last=False)
+    
+    def _apply_mapping_keys(self, detected_fields: List[Dict], data: Dict,
+                            mapping_dict: Dict) -> List[Tuple[Dict, Optional[str], Optional[float]]]:
+        keys = []
         for field in detected_fields:
             fn = field.get('field_name')
-            if fn and fn in mapping_dict:
-                key = mapping_dict[fn]
-                if key and key in data:
-                    mappings.append((field, data[key]))
-                else:
-                    mappings.append((field, None))
-            else:
-                mappings.append((field, None))
+            key = mapping_dict.get(fn) if fn else None
+            keys.append((field, key if key and key in data else None, None))
         
-        return mappings
+        return keys
     
-    def _rule_based_mapping(self, detected_fields: List[Dict], 
-                           data: Dict) -> List[Tuple[Dict, Any]]:
-        mappings = []
+    def _rule_based_keys(self, detected_fields: List[Dict],
+                         data: Dict) -> List[Tuple[Dict, Optional[str], Optional[float]]]:
+        key_index = self.get_key_index(data)
+        
+        keys = []
         for field in detected_fields:
             field_name = field.get('field_name')
+            match = key_index.match(field_name) if field_name else None
             
-            if field_name and field_name in data:
-                mappings.append((field, data[field_name]))
-                continue
-            
-            if field_name:
-                for key in data.keys():
-                    if self._fields_similar(field_name, key):
-                        mappings.append((field, data[key]))
-                        break
+            if match:
+                keys.append((field, match[0], match[1]))
             else:
-                mappings.append((field, None))
+                keys.append((field, None, None))
         
-        return mappings
+        return keys
     
-    def _fields_similar(self, field1: str, field2: str) -> bool:
-        field1 = field1.lower().replace('_', '').replace('-', '')
-        field2 = field2.lower().replace('_', '').replace('-', '')
+    def get_key_index(self, data: Dict) -> KeyIndex:
+        cache_key = tuple(data.keys())
+        key_index = self.key_index_cache.get(cache_key)
+        if key_index is not None:
+            self.key_index_cache.move_to_end(cache_key)
+            return key_index
         
-        return field1 == field2 or field1 in field2 or field2 in field1
-
-    def detect_fields_in_pdf(self, pdf_path: str) -> List[Dict]:
-        doc = fitz.open(pdf_path)
+        key_index = KeyIndex(cache_key, self.synonyms, self.key_match_threshold)
+        self.key_index_cache[cache_key] = key_index
+        while len(self.key_index_cache) > self.mapping_cache_size:
+            self.key_index_cache.popitem(last=False)
+        return key_index
+    
+    def detect_fields_in_pdf(self, pdf_path: str, start: int = 0,
+                             stop: Optional[int] = None,
+                             workers: Optional[int] = None) -> List[Field]:
+        pages = run_page_ranges(_detect_fields_in_page_range, pdf_path,
+                                start, stop, workers or self.pdf_workers, self)
+        
+        fields = [field for _, page_fields, _ in pages for field in page_fields]
+        
+        scanned_pages = [page_num for page_num, _, image_only in pages if image_only]
+        if scanned_pages and self.ocr_processor is not None:
+            try:
+                ocr_lines = self.ocr_processor.ocr_pages(pdf_path, scanned_pages)
+            except Exception as e:
+                print(f"OCR failed: {e}. Skipping scanned pages.")
+                ocr_lines = {}
+            
+            for page_num, lines in ocr_lines.items():
+                fields.extend(self._detect_in_ocr_lines(lines, page_num))
+            fields.sort(key=lambda x: x.page)
+        
+        return fields
+    
+    def iter_fields_in_pdf(self, pdf_path: str, start: int = 0,
+                           stop: Optional[int] = None) -> Iterator[Tuple[int, List[Field]]]:
+        with fitz.open(pdf_path) as doc:
+            stop = doc.page_count if stop is None else min(stop, doc.page_count)
+            for page_num in range(start, stop):
+                yield page_num, self._detect_in_pdf_page(doc[page_num], page_num)
+    
+    def _detect_in_ocr_lines(self, lines: List[Dict], page_num: int) -> List[Field]:
+        return self._detect_in_pdf_lines(lines, page_num, OCR_LAYOUT, source='ocr')
+    
+    def _detect_in_pdf_page(self, page, page_num: int) -> List[Field]:
+        textpage = page.get_textpage(flags=LOCATOR_FLAGS)
+        return self._detect_in_pdf_lines(page_lines(page, textpage), page_num, PDF_LAYOUT,
+                                         glyphs=PageGlyphs(page, textpage))
+    
+    def _detect_in_pdf_lines(self, lines: List[Dict], page_num: int,
+                             layout: Tuple[str, ...], glyphs: Optional[PageGlyphs] = None,
+                             **extra) -> List[Field]:
         fields = []
-        for page_num, page in enumerate(doc):
-            text_dict = page.get_text("dict")
-            for block in text_dict["blocks"]:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            text = span["text"]
-                            bbox = span["bbox"]  # (x0, y0, x1, y1)
-                            for pattern_name, pattern in self.patterns.items():
-                                matches = re.finditer(pattern, text)
-                                for match in matches:
-                                    # Calculate approximate bbox for the field
-                                    rel_start = match.start() / len(text) if len(text) > 0 else 0
-                                    rel_end = match.end() / len(text) if len(text) > 0 else 0
-                                    field_bbox = (
-                                        bbox[0] + rel_start * (bbox[2] - bbox[0]),
-                                        bbox[1],
-                                        bbox[0] + rel_end * (bbox[2] - bbox[0]),
-                                        bbox[3]
-                                    )
-                                    field_info = {
-                                        'type': pattern_name,
-                                        'page': page_num,
-                                        'bbox': field_bbox,
-                                        'text': match.group(0),
-                                        'value': match.group(1) if match.groups() else None,
-                                        'field_name': self._infer_field_name(pattern_name, match.group(0), text, match.start()),
-                                        'context': self._get_context(text, match.start(), match.end())
-                                    }
-                                    fields.append(field_info)
-        doc.close()
+        for line in lines:
+            text = line['text']
+            for pattern_name, match, field_name in self._find_matches(text):
+                fields.append(Field.from_match(
+                    layout, pattern_name, match, text, field_name, page=page_num,
+                    bbox=match_bbox(line, match.start(), match.end(), glyphs), **extra
+                ))
         return fields
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['mapping_cache'] = OrderedDict()
+        state['key_index_cache'] = OrderedDict()
+        state['_llm_model'] = None
+        state['ocr_processor'] = None
+        return state
+
+
+def _detect_fields_in_page_range(pdf_path: str, start: int, stop: int,
+                                 detector: FieldDetector) -> List[Tuple[int, List[Field], bool]]:
+    pages = []
+    with fitz.open(pdf_path) as doc:
+        for page_num in range(start, min(stop, doc.page_count)):
+            page = doc[page_num]
+            page_fields = detector._detect_in_pdf_page(page, page_num)
+            pages.append((page_num, page_fields, not page_fields and is_image_only_page(page)))
+    return pages
@@ -0,0 +1,97 @@
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+TEXT_LAYOUT = ('type', 'start', 'end', 'text', 'value', 'field_name')
+PARAGRAPH_LAYOUT = ('type', 'location', 'key', 'paragraph_index', 'start', 'end',
+                    'text', 'value', 'field_name', 'context')
+TABLE_LAYOUT = ('type', 'location', 'key', 'table_index', 'row_index', 'cell_index',
+                'start', 'end', 'text', 'value', 'field_name', 'context')
+PDF_LAYOUT = ('type', 'page', 'bbox', 'text', 'value', 'field_name', 'context')
+OCR_LAYOUT = PDF_LAYOUT + ('source',)
+
+CONTEXT_LENGTH = 30
+
+_DERIVED_KEYS = frozenset(('text', 'value', 'context'))
+
+
+class Field(Mapping):
+
+    __slots__ = ('layout', 'type', 'start', 'end', 'field_name', 'location', 'key',
+                 'paragraph_index', 'table_index', 'row_index', 'cell_index',
+                 'page', 'bbox', 'source', '_unit_text', '_value_start', '_value_end')
+
+    def __init__(self, layout: Tuple[str, ...], field_type: str, unit_text: str,
+                 start: int, end: int, value_span: Tuple[int, int] = (-1, -1),
+                 field_name: Optional[str] = None, location: Optional[str] = None,
+                 key: Optional[str] = None,
+                 paragraph_index: Optional[int] = None, table_index: Optional[int] = None,
+                 row_index: Optional[int] = None, cell_index: Optional[int] = None,
+                 page: Optional[int] = None, bbox: Optional[Tuple[float, ...]] = None,
+                 source: Optional[str] = None):
+        self.layout = layout
+        self.type = field_type
+        self._unit_text = unit_text
+        self.start = start
+        self.end = end
+        self._value_start, self._value_end = value_span
+        self.field_name = field_name
+        self.location = location
+        self.key = key
+        self.paragraph_index = paragraph_index
+        self.table_index = table_index
+        self.row_index = row_index
+        self.cell_index = cell_index
+        self.page = page
+        self.bbox = bbox
+        self.source = source
+
+    @classmethod
+    def from_match(cls, layout: Tuple[str, ...], field_type: str, match: Any,
+                   unit_text: str, field_name: Optional[str], **location) -> 'Field':
+        value_span = match.span(1) if match.re.groups else (-1, -1)
+        return cls(layout, field_type, unit_text, match.start(), match.end(),
+                   value_span, field_name, **location)
+
+    @property
+    def text(self) -> str:
+        return self._unit_text[self.start:self.end]
+
+    @property
+    def value(self) -> Optional[str]:
+        if self._value_start < 0:
+            return None
+        return self._unit_text[self._value_start:self._value_end]
+
+    @property
+    def context(self) -> Dict[str, str]:
+        text = self._unit_text
+        return {
+            'before': text[max(0, self.start - CONTEXT_LENGTH):self.start].strip(),
+            'after': text[self.end:min(len(text), self.end + CONTEXT_LENGTH)].strip()
+        }
+
+    @property
+    def unit_text(self) -> str:
+        return self._unit_text
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.layout:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self.layout or key in _DERIVED_KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.layout)
+
+    def __len__(self) -> int:
+        return len(self.layout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.layout}
+
+    def __repr__(self) -> str:
+        return f"Field({self.to_dict()!r})"
@@ -0,0 +1,203 @@
+import argparse
+import cProfile
+import glob
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+
+class FillProfiler:
+
+    def __init__(self, profile_dir: str = 'profiles', sample_rate: float = 0.0,
+                 threshold: Optional[float] = None,
+                 stage_thresholds: Optional[Dict[str, float]] = None,
+                 trace_memory: bool = False, memory_top: int = 10):
+        self.profile_dir = profile_dir
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.stage_thresholds = stage_thresholds or {}
+        self.trace_memory = trace_memory
+        self.memory_top = memory_top
+        self._lock = threading.Lock()
+        self._counter = 0
+        self.documents = 0
+        self.sampled = 0
+        self.slow = 0
+        self.saved = 0
+
+    def _slow_stages(self, stages: Dict[str, float]) -> List[str]:
+        slow = []
+        for stage, elapsed in stages.items():
+            limit = self.stage_thresholds.get(stage, self.threshold)
+            if limit is not None and elapsed >= limit:
+                slow.append(stage)
+        return slow
+
+    def _snapshot(self, filler, started: float) -> Dict[str, Any]:
+        stats = dict(filler.last_fill_stats)
+        stats['stages'] = dict(stats.get('stages') or {})
+        stats['total'] = time.perf_counter() - started
+        return stats
+
+    def _profiled(self, func):
+        started_tracing = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Другой профилировщик уже активен в этом процессе
+            profile = None
+
+        memory = None
+        try:
+            result = func()
+        finally:
+            if profile is not None:
+                profile.disable()
+            if self.trace_memory:
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                memory = {
+                    'current': current,
+                    'peak': peak,
+                    'top': [{'location': str(stat.traceback), 'size': stat.size, 'count': stat.count}
+                            for stat in snapshot.statistics('lineno')[:self.memory_top]]
+                }
+                if started_tracing:
+                    tracemalloc.stop()
+
+        return result, profile, memory
+
+    def run(self, filler, template_path: str, data: Dict, output_path: Any,
+            mapping: Optional[Dict] = None) -> Any:
+        with self._lock:
+            self.documents += 1
+
+        if self.sample_rate and random.random() < self.sample_rate:
+            started = time.perf_counter()
+            result, profile, memory = self._profiled(
+                lambda: filler._fill_document(template_path, data, output_path, mapping)
+            )
+            stats = self._snapshot(filler, started)
+            with self._lock:
+                self.sampled += 1
+            self._save(filler, stats, profile, memory, 'sample')
+            return result
+
+        started = time.perf_counter()
+        result = filler._fill_document(template_path, data, output_path, mapping)
+        stats = self._snapshot(filler, started)
+
+        slow_stages = self._slow_stages(stats['stages'])
+        if slow_stages:
+            with self._lock:
+                self.slow += 1
+            # Повторный прогон в память: исходный результат уже сохранён
+            filler.last_fill_stats = {'template_path': template_path, 'stages': {}}
+            _, profile, memory = self._profiled(
+                lambda: filler._render_document(template_path, data, io.BytesIO(), mapping)
+            )
+            filler.last_fill_stats = stats
+            self._save(filler, dict(stats, slow_stages=slow_stages), profile, memory, 'threshold')
+
+        return result
+
+    def _save(self, filler, stats: Dict[str, Any], profile: Optional[cProfile.Profile],
+              memory: Optional[Dict[str, Any]], reason: str):
+        template_path = stats.get('template_path')
+        template_hash = filler.template_cache.get(template_path)['content_hash']
+
+        with self._lock:
+            self._counter += 1
+            counter = self._counter
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base_name = f"{time.strftime('%Y%m%d-%H%M%S')}_{template_hash[:12]}_{os.getpid()}_{counter}"
+        base_path = os.path.join(self.profile_dir, base_name)
+
+        if profile is not None:
+            profile.dump_stats(f'{base_path}.prof')
+
+        metadata = dict(stats, template_hash=template_hash, reason=reason,
+                        profile=f'{base_name}.prof' if profile is not None else None,
+                        memory=memory, created_at=time.time())
+        with open(f'{base_path}.json', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2, default=str)
+
+        with self._lock:
+            self.saved += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'documents': self.documents,
+                'sampled': self.sampled,
+                'slow': self.slow,
+                'saved': self.saved
+            }
+
+
+def aggregate_profiles(profile_dir: str, limit: int = 20,
+                       sort: str = 'cumulative') -> Dict[str, Any]:
+    templates = {}
+    for path in sorted(glob.glob(os.path.join(profile_dir, '*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        entry = templates.setdefault(metadata['template_hash'], {
+            'template_path': metadata.get('template_path'),
+            'profiles': 0,
+            'max_total': 0.0,
+            'stages': {}
+        })
+        entry['profiles'] += 1
+        entry['max_total'] = max(entry['max_total'], metadata.get('total') or 0.0)
+        for stage, elapsed in (metadata.get('stages') or {}).items():
+            entry['stages'][stage] = max(entry['stages'].get(stage, 0.0), elapsed)
+
+    profile_paths = sorted(glob.glob(os.path.join(profile_dir, '*.prof')))
+    functions = []
+    if profile_paths:
+        stats = pstats.Stats(profile_paths[0], stream=io.StringIO())
+        for path in profile_paths[1:]:
+            stats.add(path)
+
+        sort_index = {'cumulative': 3, 'tottime': 2, 'ncalls': 1}[sort]
+        rows = []
+        for (filename, lineno, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append((f'{filename}:{lineno}({name})', ncalls, tottime, cumtime))
+        rows.sort(key=lambda row: row[sort_index], reverse=True)
+
+        functions = [{'function': function, 'ncalls': ncalls,
+                      'tottime': round(tottime, 6), 'cumtime': round(cumtime, 6)}
+                     for function, ncalls, tottime, cumtime in rows[:limit]]
+
+    return {
+        'profiles': len(profile_paths),
+        'templates': templates,
+        'functions': functions
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate DocuFiller fill profiles')
+    parser.add_argument('profile_dir', nargs='?', default='profiles')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--sort', choices=('cumulative', 'tottime', 'ncalls'), default='cumulative')
+    args = parser.parse_args()
+
+    report = aggregate_profiles(args.profile_dir, limit=args.limit, sort=args.sort)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Dict, Optional, Any
+
+from database_manager import DatabaseManager
+from document_filler import DocumentFiller
+from render_cache import RenderCache
+from template_store import TemplateStore
+
+
+class FillWorker:
+
+    def __init__(self, db: DatabaseManager, filler: Optional[DocumentFiller] = None,
+                 worker_id: Optional[str] = None, lease_seconds: float = 300,
+                 poll_interval: float = 1.0, retry_delay: float = 5.0,
+                 heartbeat_interval: Optional[float] = None,
+                 template_store: Optional[TemplateStore] = None):
+        self.db = db
+        self.filler = filler if filler is not None else DocumentFiller()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.heartbeat_interval = heartbeat_interval
+        self.template_store = template_store
+        self.jobs_reclaimed = 0
+        self.jobs_lost = 0
+        self.started_at = time.time()
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.jobs_retried = 0
+        self.busy_seconds = 0.0
+        self._stopped = False
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread = None
+
+    def _resolve_template(self, job: Dict) -> str:
+        if job.get('template_hash') and self.template_store is not None:
+            ext = os.path.splitext(job['template_path'])[1].lower()
+            return self.template_store.fetch(job['template_hash'], ext)
+        return job['template_path']
+
+    def _heartbeat(self, db: DatabaseManager, status: str = 'active'):
+        db.heartbeat_fill_worker(self.worker_id, self.lease_seconds,
+                                 hostname=socket.gethostname(), pid=os.getpid(),
+                                 jobs_completed=self.jobs_completed,
+                                 jobs_failed=self.jobs_failed, status=status)
+
+    def _heartbeat_loop(self):
+        with DatabaseManager(self.db.db_path, timeout=self.db.timeout) as db:
+            while not self._heartbeat_stop.wait(self.heartbeat_interval):
+                try:
+                    self._heartbeat(db)
+                    self.jobs_reclaimed += db.reclaim_expired_fill_jobs()
+                except Exception as e:
+                    print(f"Heartbeat failed: {e}")
+
+    def _start_heartbeat(self):
+        self._heartbeat(self.db)
+        self._heartbeat_stop.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._heartbeat_thread.start()
+
+    def _stop_heartbeat(self):
+        self._heartbeat_stop.set()
+        self._heartbeat_thread.join()
+        self._heartbeat_thread = None
+        self._heartbeat(self.db, status='stopped')
+
+    def _resolve_data(self, job: Dict) -> Dict:
+        data = {}
+        if job.get('organization_id') or job.get('person_id') or job.get('data_card_id'):
+            data.update(self.db.get_complete_data_for_document(
+                organization_id=job.get('organization_id'),
+                person_id=job.get('person_id'),
+                data_card_id=job.get('data_card_id')
+            ))
+        if job.get('data'):
+            data.update(job['data'])
+        return data
+
+    def process_job(self, job: Dict) -> Dict[str, Any]:
+        start_time = time.perf_counter()
+
+        try:
+            data = self._resolve_data(job)
+            output_dir = os.path.dirname(job['output_path'])
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            template_path = self._resolve_template(job)
+            output_path = self.filler.fill_document(template_path, data, job['output_path'])
+        except Exception as e:
+            duration = time.perf_counter() - start_time
+            self.busy_seconds += duration
+
+            status = self.db.fail_fill_job(job['id'], self.worker_id, str(e),
+                                           retry_delay=self.retry_delay,
+                                           record_history=True)
+            if status == 'failed':
+                self.jobs_failed += 1
+            elif status is not None:
+                self.jobs_retried += 1
+            else:
+                self.jobs_lost += 1
+
+            return {
+                'success': False,
+                'job_id': job['id'],
+                'status': status or 'lease_lost',
+                'error': str(e),
+                'duration': duration
+            }
+
+        duration = time.perf_counter() - start_time
+        self.busy_seconds += duration
+
+        # Аренду могли перехватить после истечения: такой результат не засчитывается
+        if not self.db.complete_fill_job(job['id'], self.worker_id, duration=duration,
+                                         record_history=True, output_path=output_path):
+            self.jobs_lost += 1
+            return {
+                'success': False,
+                'job_id': job['id'],
+                'status': 'lease_lost',
+                'output_path': output_path,
+                'duration': duration
+            }
+        self.jobs_completed += 1
+
+        return {
+            'success': True,
+            'job_id': job['id'],
+            'status': 'completed',
+            'output_path': output_path,
+            'history_id': self.db.get_fill_job(job['id'])['history_id'],
+            'duration': duration
+        }
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        job = self.db.claim_fill_job(self.worker_id, self.lease_seconds)
+        if job is None:
+            return None
+        return self.process_job(job)
+
+    def run(self, max_jobs: Optional[int] = None,
+            idle_timeout: Optional[float] = None) -> Dict[str, Any]:
+        self._stopped = False
+        processed = 0
+        idle_since = time.time()
+
+        if self.heartbeat_interval:
+            self._start_heartbeat()
+
+        try:
+            while not self._stopped:
+                if max_jobs is not None and processed >= max_jobs:
+                    break
+
+                result = self.run_once()
+                if result is None:
+                    if idle_timeout is not None and time.time() - idle_since >= idle_timeout:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+
+                processed += 1
+                idle_since = time.time()
+        finally:
+            if self._heartbeat_thread is not None:
+                self._stop_heartbeat()
+
+        return self.get_stats()
+
+    def stop(self):
+        self._stopped = True
+
+    def get_stats(self) -> Dict[str, Any]:
+        elapsed = time.time() - self.started_at
+        processed = self.jobs_completed + self.jobs_failed + self.jobs_retried + self.jobs_lost
+        # Подойдёт любой объект с fill_document, кэши у него могут отсутствовать
+        template_cache = getattr(self.filler, 'template_cache', None)
+        field_detector = getattr(self.filler, 'field_detector', None)
+        render_cache = getattr(self.filler, 'render_cache', None)
+
+        return {
+            'worker_id': self.worker_id,
+            'uptime': elapsed,
+            'jobs_completed': self.jobs_completed,
+            'jobs_failed': self.jobs_failed,
+            'jobs_retried': self.jobs_retried,
+            'jobs_reclaimed': self.jobs_reclaimed,
+            'jobs_lost': self.jobs_lost,
+            'throughput': self.jobs_completed / elapsed if elapsed > 0 else 0.0,
+            'avg_duration': self.busy_seconds / processed if processed else 0.0,
+            'utilization': self.busy_seconds / elapsed if elapsed > 0 else 0.0,
+            'queue': self.db.get_fill_queue_stats(),
+            'template_cache': template_cache.get_stats() if template_cache is not None else None,
+            'mapping_cache_entries': (len(field_detector.mapping_cache)
+                                      if field_detector is not None else None),
+            'render_cache': render_cache.get_stats() if render_cache is not None else None
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DocuFiller fill worker daemon')
+    parser.add_argument('--db', default='documents_data.db')
+    parser.add_argument('--worker-id')
+    parser.add_argument('--lease-seconds', type=float, default=300)
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--retry-delay', type=float, default=5.0)
+    parser.add_argument('--max-jobs', type=int)
+    parser.add_argument('--idle-timeout', type=float)
+    parser.add_argument('--render-cache', action='store_true')
+    parser.add_argument('--blob-dir')
+    parser.add_argument('--heartbeat-interval', type=float)
+    parser.add_argument('--template-store')
+    parser.add_argument('--local-cache-dir')
+    parser.add_argument('--history-retention-days', type=int)
+    args = parser.parse_args()
+
+    with DatabaseManager(args.db, history_retention_days=args.history_retention_days) as db:
+        archived = db.archive_document_history()
+        if archived:
+            print(f"Archived document history: {archived}")
+
+        template_store = None
+        if args.template_store:
+            template_store = TemplateStore(args.template_store, local_dir=args.local_cache_dir)
+
+        filler = None
+        if args.render_cache or args.blob_dir or template_store is not None:
+            filler = DocumentFiller(
+                render_cache=(RenderCache(db, blob_dir=args.blob_dir)
+                              if args.render_cache or args.blob_dir else None)
+            )
+            filler.field_detector.mapping_store = template_store
+        worker = FillWorker(db, filler=filler, worker_id=args.worker_id,
+                            lease_seconds=args.lease_seconds,
+                            poll_interval=args.poll_interval,
+                            retry_delay=args.retry_delay,
+                            heartbeat_interval=args.heartbeat_interval,
+                            template_store=template_store)
+
+        signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+
+        stats = worker.run(max_jobs=args.max_jobs, idle_timeout=args.idle_timeout)
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
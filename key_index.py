@@ -0,0 +1,146 @@
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+DEFAULT_SYNONYMS = {
+    'full_name': ['фио', 'ф.и.о', 'ф.и.о.', 'полное имя', 'name', 'fio', 'name_full'],
+    'first_name': ['имя', 'firstname', 'given_name'],
+    'last_name': ['фамилия', 'lastname', 'surname'],
+    'middle_name': ['отчество', 'patronymic'],
+    'organization': ['организация', 'компания', 'наименование организации', 'company', 'org'],
+    'date': ['дата', 'число'],
+    'position': ['должность', 'post', 'job_title'],
+    'address': ['адрес', 'addr'],
+    'phone': ['телефон', 'тел', 'tel', 'phone_number'],
+    'email': ['почта', 'электронная почта', 'e-mail', 'mail'],
+    'inn': ['инн', 'tax_id'],
+    'kpp': ['кпп'],
+    'ogrn': ['огрн'],
+    'account_number': ['расчетный счет', 'р/с', 'счет', 'account'],
+    'corr_account': ['корреспондентский счет', 'к/с', 'корр. счет'],
+    'bank_name': ['банк', 'bank'],
+    'bank_bik': ['бик', 'bik'],
+    'amount': ['сумма', 'sum', 'total'],
+    'number': ['номер', '№', 'no'],
+    'contract_number': ['номер договора', 'договор №'],
+    'signature': ['подпись'],
+    'director_name': ['директор', 'руководитель'],
+}
+
+
+def normalize_key(key: str) -> str:
+    return ''.join(ch for ch in key.lower().replace('ё', 'е') if ch not in '_- ')
+
+
+def segment_prefixes(key: str) -> Set[str]:
+    prefixes = set()
+    prefix = ''
+    for segment in re.split(r'[_\- ]+', key):
+        prefix += normalize_key(segment)
+        if prefix:
+            prefixes.add(prefix)
+    return prefixes
+
+
+def trigrams(text: str) -> List[str]:
+    padded = f'  {text} '
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class KeyIndex:
+
+    def __init__(self, keys: Iterable[str],
+                 synonyms: Optional[Dict[str, List[str]]] = None,
+                 min_score: float = 0.5):
+        self.keys = list(keys)
+        self.min_score = min_score
+        self._exact = set(self.keys)
+        self._normalized: Dict[str, str] = {}
+        self._groups: Dict[str, str] = {}
+        self._keys_by_group: Dict[str, List[str]] = defaultdict(list)
+        self._trigram_index: Dict[str, List[int]] = defaultdict(list)
+        self._key_trigram_counts: List[int] = []
+        self._normalized_keys: List[str] = []
+        self._key_prefixes: List[Set[str]] = []
+        self._memo: Dict[str, Optional[Tuple[str, float]]] = {}
+
+        for group, aliases in (synonyms if synonyms is not None else DEFAULT_SYNONYMS).items():
+            for alias in [group] + list(aliases):
+                self._groups.setdefault(normalize_key(alias), group)
+
+        for key_id, key in enumerate(self.keys):
+            normalized = normalize_key(key)
+            self._normalized.setdefault(normalized, key)
+            self._normalized_keys.append(normalized)
+            self._key_prefixes.append(segment_prefixes(key))
+
+            group = self._groups.get(normalized)
+            if group is not None:
+                self._keys_by_group[group].append(key)
+
+            key_trigrams = set(trigrams(normalized))
+            self._key_trigram_counts.append(len(key_trigrams))
+            for trigram in key_trigrams:
+                self._trigram_index[trigram].append(key_id)
+
+    def match(self, field_name: str) -> Optional[Tuple[str, float]]:
+        if field_name in self._memo:
+            return self._memo[field_name]
+
+        result = self._match(field_name)
+        self._memo[field_name] = result
+        return result
+
+    def _match(self, field_name: str) -> Optional[Tuple[str, float]]:
+        if field_name in self._exact:
+            return field_name, 1.0
+
+        normalized = normalize_key(field_name)
+        if not normalized:
+            return None
+
+        if normalized in self._normalized:
+            return self._normalized[normalized], 0.95
+
+        group = self._groups.get(normalized)
+        if group is not None and self._keys_by_group.get(group):
+            return self._keys_by_group[group][0], 0.9
+
+        best = None
+        for key_id, score in self._scored_candidates(field_name):
+            candidate = (score, -len(self._normalized_keys[key_id]), -key_id)
+            if best is None or candidate > best:
+                best = candidate
+
+        if best is None or best[0] < self.min_score:
+            return None
+        return self.keys[-best[2]], round(best[0], 4)
+
+    def _scored_candidates(self, field_name: str) -> List[Tuple[int, float]]:
+        normalized = normalize_key(field_name)
+        field_prefixes = segment_prefixes(field_name)
+        field_trigrams = set(trigrams(normalized))
+        shared = defaultdict(int)
+        for trigram in field_trigrams:
+            for key_id in self._trigram_index.get(trigram, ()):
+                shared[key_id] += 1
+
+        scored = []
+        for key_id, count in shared.items():
+            key_normalized = self._normalized_keys[key_id]
+            score = 2 * count / (len(field_trigrams) + self._key_trigram_counts[key_id])
+
+            # Бонус только за начальные сегменты: name не должно совпадать с bank_name
+            if (normalized in self._key_prefixes[key_id]
+                    or key_normalized in field_prefixes):
+                shorter, longer = sorted((normalized, key_normalized), key=len)
+                score = max(score, len(shorter) / len(longer))
+
+            scored.append((key_id, score))
+        return scored
+
+    def candidates(self, field_name: str, limit: int = 5) -> List[Tuple[str, float]]:
+        scored = [(self.keys[key_id], round(score, 4))
+                  for key_id, score in self._scored_candidates(field_name)]
+        scored.sort(key=lambda x: -x[1])
+        return scored[:limit]
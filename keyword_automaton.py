@@ -0,0 +1,77 @@
+from bisect import bisect_right
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class KeywordHits:
+
+    def __init__(self, hits: List[Tuple[int, int, str]]):
+        hits.sort(key=lambda hit: (hit[1], hit[1] - hit[0]))
+        self.starts = [hit[0] for hit in hits]
+        self.ends = [hit[1] for hit in hits]
+        self.values = [hit[2] for hit in hits]
+
+    def nearest_before(self, position: int, window: int = 50) -> Optional[str]:
+        window_start = position - window
+        idx = bisect_right(self.ends, position) - 1
+        while idx >= 0 and self.ends[idx] > window_start:
+            if self.starts[idx] >= window_start:
+                return self.values[idx]
+            idx -= 1
+        return None
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+
+class KeywordAutomaton:
+
+    def __init__(self, keywords: Iterable[Tuple[str, str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, str]]] = [[]]
+
+        for keyword, value in keywords:
+            keyword = keyword.lower()
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            if not any(length == len(keyword) for length, _ in self._output[state]):
+                self._output[state].append((len(keyword), value))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def scan(self, text: str) -> KeywordHits:
+        hits = []
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+
+        for position, ch in enumerate(text.lower()):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, value in output[state]:
+                end = position + 1
+                hits.append((end - length, end, value))
+
+        return KeywordHits(hits)
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Any
+
+import pymupdf as fitz
+import pytesseract
+from PIL import Image
+
+from pdf_locator import build_line
+
+MIN_PAGE_TEXT_CHARS = 10
+
+
+def is_image_only_page(page, min_text_chars: int = MIN_PAGE_TEXT_CHARS) -> bool:
+    if len(page.get_text().strip()) >= min_text_chars:
+        return False
+    return len(page.get_images(full=False)) > 0
+
+
+def _ocr_page(pdf_path: str, page_num: int, dpi: int, languages: str) -> List[Dict[str, Any]]:
+    with fitz.open(pdf_path) as doc:
+        page = doc[page_num]
+        scale = dpi / 72
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale))
+        image = Image.frombytes('RGB' if pixmap.n < 4 else 'RGBA',
+                                (pixmap.width, pixmap.height), pixmap.samples)
+        derotation = page.derotation_matrix
+
+        data = pytesseract.image_to_data(image, lang=languages,
+                                         output_type=pytesseract.Output.DICT)
+
+        words = []
+        for i, text in enumerate(data['text']):
+            text = text.strip()
+            if not text:
+                continue
+            rect = fitz.Rect(
+                data['left'][i] / scale,
+                data['top'][i] / scale,
+                (data['left'][i] + data['width'][i]) / scale,
+                (data['top'][i] + data['height'][i]) / scale
+            ) * derotation
+            words.append({
+                'text': text,
+                'bbox': (rect.x0, rect.y0, rect.x1, rect.y1),
+                'conf': float(data['conf'][i]),
+                'line': (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            })
+        return words
+
+
+def group_words_into_lines(words: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    lines: OrderedDict = OrderedDict()
+    for word in words:
+        lines.setdefault(tuple(word['line']), []).append((word['text'], tuple(word['bbox'])))
+    return [build_line(line_words) for line_words in lines.values()]
+
+
+class OCRProcessor:
+
+    def __init__(self, cache_dir: Optional[str] = None, languages: str = 'rus+eng',
+                 dpi: int = 300, workers: Optional[int] = None,
+                 max_entries: int = 256):
+        self.cache_dir = cache_dir
+        self.languages = languages
+        self.dpi = dpi
+        self.workers = workers
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def page_image_hash(self, doc, page) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{self.languages}:{self.dpi}:{page.rotation}:{tuple(page.rect)}".encode('utf-8'))
+        for image in page.get_images(full=False):
+            digest.update(doc.xref_stream_raw(image[0]) or b'')
+        return digest.hexdigest()
+
+    def find_image_only_pages(self, pdf_path: str) -> List[int]:
+        with fitz.open(pdf_path) as doc:
+            return [page.number for page in doc if is_image_only_page(page)]
+
+    def _cache_path(self, image_hash: str) -> str:
+        return os.path.join(self.cache_dir, image_hash[:2], f'{image_hash}.json')
+
+    def _cache_get(self, image_hash: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            words = self._entries.get(image_hash)
+            if words is not None:
+                self._entries.move_to_end(image_hash)
+                return words
+
+        if self.cache_dir:
+            try:
+                with open(self._cache_path(image_hash), 'r', encoding='utf-8') as f:
+                    words = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._remember(image_hash, words)
+            return words
+
+        return None
+
+    def _cache_put(self, image_hash: str, words: List[Dict[str, Any]]):
+        self._remember(image_hash, words)
+
+        if self.cache_dir:
+            path = self._cache_path(image_hash)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(words, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+    def _remember(self, image_hash: str, words: List[Dict[str, Any]]):
+        with self._lock:
+            self._entries[image_hash] = words
+            self._entries.move_to_end(image_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def ocr_pages(self, pdf_path: str,
+                  page_numbers: Optional[List[int]] = None) -> Dict[int, List[Dict[str, Any]]]:
+        if page_numbers is None:
+            page_numbers = self.find_image_only_pages(pdf_path)
+
+        results = {}
+        pending = {}
+        with fitz.open(pdf_path) as doc:
+            for page_num in page_numbers:
+                image_hash = self.page_image_hash(doc, doc[page_num])
+                words = self._cache_get(image_hash)
+                if words is not None:
+                    results[page_num] = words
+                else:
+                    pending[page_num] = image_hash
+
+        with self._lock:
+            self.hits += len(results)
+            self.misses += len(pending)
+
+        workers = self.workers or os.cpu_count() or 1
+        if len(pending) > 1 and workers > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+                futures = {page_num: executor.submit(_ocr_page, pdf_path, page_num,
+                                                     self.dpi, self.languages)
+                           for page_num in pending}
+                ocr_results = {page_num: future.result() for page_num, future in futures.items()}
+        else:
+            ocr_results = {page_num: _ocr_page(pdf_path, page_num, self.dpi, self.languages)
+                           for page_num in pending}
+
+        for page_num, words in ocr_results.items():
+            self._cache_put(pending[page_num], words)
+            results[page_num] = words
+
+        return {page_num: group_words_into_lines(results[page_num])
+                for page_num in sorted(results)}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
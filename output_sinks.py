@@ -0,0 +1,114 @@
+import os
+import zipfile
+from typing import List
+
+import pymupdf as fitz
+
+
+class DirectorySink:
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.names: List[str] = []
+        os.makedirs(output_dir, exist_ok=True)
+
+    def add(self, name: str, content: bytes) -> str:
+        path = os.path.join(self.output_dir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        self.names.append(path)
+        return path
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ZipSink:
+
+    def __init__(self, zip_path, compression: int = zipfile.ZIP_DEFLATED):
+        self.zip_path = zip_path
+        self.archive = zipfile.ZipFile(zip_path, 'w', compression=compression)
+        self.names: List[str] = []
+        self._used = set()
+
+    def _unique_name(self, name: str) -> str:
+        if name not in self._used:
+            return name
+        base, ext = os.path.splitext(name)
+        counter = 2
+        while f"{base}_{counter}{ext}" in self._used:
+            counter += 1
+        return f"{base}_{counter}{ext}"
+
+    def add(self, name: str, content: bytes) -> str:
+        name = self._unique_name(name)
+        self._used.add(name)
+        self.archive.writestr(name, content)
+        self.names.append(name)
+        return name
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MergedPdfSink:
+
+    def __init__(self, output_path: str, flush_every: int = 100):
+        self.output_path = output_path
+        self.flush_every = flush_every
+        self.names: List[str] = []
+        self._merged = fitz.open()
+        self._pending = 0
+        self._saved = False
+
+    def add(self, name: str, content: bytes) -> str:
+        if os.path.splitext(name)[1].lower() != '.pdf':
+            raise ValueError(f"Объединение поддерживает только PDF: {name}")
+
+        with fitz.open(stream=content, filetype='pdf') as doc:
+            self._merged.insert_pdf(doc)
+
+        self.names.append(name)
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self._flush()
+        return name
+
+    def _flush(self):
+        if not self._saved:
+            self._merged.save(self.output_path, garbage=1)
+            self._saved = True
+        elif self._pending:
+            self._merged.saveIncr()
+        # Повторное открытие сбрасывает загруженные страницы, иначе они копятся в памяти
+        self._merged.close()
+        self._merged = fitz.open(self.output_path)
+        self._pending = 0
+
+    def close(self):
+        if self._merged is None:
+            return
+        if self._merged.page_count:
+            self._flush()
+        self._merged.close()
+        self._merged = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import pymupdf as fitz
+
+PARALLEL_PAGE_THRESHOLD = 64
+MIN_CHUNK_PAGES = 16
+
+
+def get_page_count(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def page_ranges(start: int, stop: int, workers: Optional[int] = None) -> List[Tuple[int, int]]:
+    workers = workers or os.cpu_count() or 1
+    total = stop - start
+    if total <= 0:
+        return []
+    if workers <= 1 or total < PARALLEL_PAGE_THRESHOLD:
+        return [(start, stop)]
+
+    chunk_size = max(MIN_CHUNK_PAGES, -(-total // (workers * 4)))
+    return [(chunk_start, min(chunk_start + chunk_size, stop))
+            for chunk_start in range(start, stop, chunk_size)]
+
+
+def run_page_ranges(func: Callable[..., List[Any]], pdf_path: str,
+                    start: int = 0, stop: Optional[int] = None,
+                    workers: Optional[int] = None, *args) -> List[Any]:
+    if stop is None:
+        stop = get_page_count(pdf_path)
+
+    ranges = page_ranges(start, stop, workers)
+    if not ranges:
+        return []
+    if len(ranges) == 1:
+        return func(pdf_path, start, stop, *args)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(ranges))) as executor:
+        futures = [executor.submit(func, pdf_path, range_start, range_stop, *args)
+                   for range_start, range_stop in ranges]
+        for future in futures:
+            results.extend(future.result())
+    return results
+
+
+def iter_page_texts(pdf_path: str, start: int = 0,
+                    stop: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    with fitz.open(pdf_path) as doc:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for page_num in range(start, stop):
+            yield page_num, doc[page_num].get_text()
+
+
+def extract_page_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    return [text for _, text in iter_page_texts(pdf_path, start, stop)]
+
+
+def extract_page_texts(pdf_path: str, start: int = 0, stop: Optional[int] = None,
+                       workers: Optional[int] = None) -> List[str]:
+    return run_page_ranges(extract_page_range, pdf_path, start, stop, workers)
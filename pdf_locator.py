@@ -0,0 +1,98 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pymupdf as fitz
+
+LOCATOR_FLAGS = fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+
+BBox = Tuple[float, float, float, float]
+
+
+def union_bbox(boxes: Sequence[BBox]) -> BBox:
+    if len(boxes) == 1:
+        return boxes[0]
+    return (
+        min(b[0] for b in boxes), min(b[1] for b in boxes),
+        max(b[2] for b in boxes), max(b[3] for b in boxes)
+    )
+
+
+def build_line(words: List[Tuple[str, BBox]], key: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    return {'text': ' '.join(text for text, _ in words), 'words': words, 'key': key}
+
+
+def page_lines(page, textpage=None) -> List[Dict[str, Any]]:
+    lines = []
+    current_key = None
+    current_words = []
+    words = page.get_text('words', flags=LOCATOR_FLAGS, textpage=textpage)
+    for x0, y0, x1, y1, text, block_no, line_no, _ in words:
+        key = (block_no, line_no)
+        if key != current_key and current_words:
+            lines.append(build_line(current_words, current_key))
+            current_words = []
+        current_key = key
+        current_words.append((text, (x0, y0, x1, y1)))
+    if current_words:
+        lines.append(build_line(current_words, current_key))
+    return lines
+
+
+class PageGlyphs:
+
+    def __init__(self, page, textpage=None):
+        self.page = page
+        self.textpage = textpage
+        self._lines: Optional[Dict[Tuple[int, int], List[Dict[str, Any]]]] = None
+
+    def _load(self) -> Dict[Tuple[int, int], List[Dict[str, Any]]]:
+        lines = {}
+        for block in self.page.get_text('rawdict', flags=LOCATOR_FLAGS,
+                                            textpage=self.textpage)['blocks']:
+            for line_no, line in enumerate(block.get('lines', [])):
+                lines[(block['number'], line_no)] = [char for span in line['spans']
+                                                     for char in span['chars']]
+        return lines
+
+    def word_bboxes(self, line_key: Optional[Tuple[int, int]], bbox: BBox,
+                    text: str) -> Optional[List[BBox]]:
+        # Страница разбирается один раз, при первом совпадении внутри слова
+        if self._lines is None:
+            self._lines = self._load()
+
+        x0, y0, x1, y1 = bbox
+        chars = [char for char in self._lines.get(line_key, [])
+                 if x0 <= (char['bbox'][0] + char['bbox'][2]) / 2 <= x1
+                 and y0 <= (char['bbox'][1] + char['bbox'][3]) / 2 <= y1]
+        offset = ''.join(char['c'] for char in chars).find(text)
+        if offset < 0:
+            return None
+        return [char['bbox'] for char in chars[offset:offset + len(text)]]
+
+
+def match_bbox(line: Dict[str, Any], start: int, end: int,
+               glyphs: Optional[PageGlyphs] = None) -> BBox:
+    boxes = []
+    word_start = 0
+    for text, bbox in line['words']:
+        word_end = word_start + len(text)
+        if word_start >= end:
+            break
+        if word_end > start:
+            x0, y0, x1, y1 = bbox
+            word_glyphs = None
+            if (start > word_start or end < word_end) and glyphs is not None:
+                # Ширина символов пропорционального шрифта различается, берём точные боксы глифов
+                word_glyphs = glyphs.word_bboxes(line.get('key'), bbox, text)
+            if word_glyphs is not None:
+                fragment = word_glyphs[max(start, word_start) - word_start:min(end, word_end) - word_start]
+                x0, x1 = min(g[0] for g in fragment), max(g[2] for g in fragment)
+            elif start > word_start or end < word_end:
+                char_width = (x1 - x0) / len(text)
+                x0, x1 = (x0 + (max(start, word_start) - word_start) * char_width,
+                          x0 + (min(end, word_end) - word_start) * char_width)
+            boxes.append((x0, y0, x1, y1))
+        word_start = word_end + 1
+
+    if not boxes:
+        boxes = [bbox for _, bbox in line['words']]
+    return union_bbox(boxes)
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+RENDER_ENGINE_VERSION = '1'
+
+
+def _canonical_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.strftime('%d.%m.%Y')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {str(k): _canonical_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical_value(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def canonical_data_hash(data: Dict, mapping: Optional[Dict] = None,
+                        options: Optional[Dict] = None) -> str:
+    payload = {
+        'data': _canonical_value(data),
+        'mapping': _canonical_value(mapping or {}),
+        'options': _canonical_value(options or {})
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RenderCache:
+
+    def __init__(self, db, blob_dir: Optional[str] = None,
+                 engine_version: str = RENDER_ENGINE_VERSION):
+        self.db = db
+        self.blob_dir = blob_dir
+        self.engine_version = engine_version
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if blob_dir:
+            os.makedirs(blob_dir, exist_ok=True)
+
+    def render_key(self, template_hash: str, data_hash: str) -> str:
+        return hashlib.sha256(
+            f"{template_hash}:{data_hash}:{self.engine_version}".encode('utf-8')
+        ).hexdigest()
+
+    def _blob_path(self, output_hash: str, ext: str) -> str:
+        return os.path.join(self.blob_dir, output_hash[:2], f'{output_hash}{ext}')
+
+    def _is_intact(self, entry: Dict[str, Any]) -> bool:
+        try:
+            stat = os.stat(entry['output_path'])
+        except OSError:
+            return False
+        return stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime_ns']
+
+    def _materialize(self, source_path: str, output_path: str):
+        if os.path.abspath(source_path) == os.path.abspath(output_path):
+            return
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.lexists(output_path):
+            os.remove(output_path)
+        try:
+            os.link(source_path, output_path)
+        except OSError:
+            shutil.copyfile(source_path, output_path)
+
+    def reuse(self, render_key: str, output_path: str) -> bool:
+        entry = self.db.get_render(render_key)
+        if entry is not None and self._is_intact(entry):
+            try:
+                self._materialize(entry['output_path'], output_path)
+            except OSError:
+                entry = None
+        else:
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return False
+            self.hits += 1
+
+        self.db.touch_render(render_key)
+        return True
+
+    def prepare_output(self, output_path: str):
+        # Вывод может быть жёсткой ссылкой на прошлый результат: пишем в новый inode
+        if os.path.lexists(output_path):
+            os.remove(output_path)
+
+    def store(self, render_key: str, template_hash: str, data_hash: str, output_path: str):
+        output_hash = file_hash(output_path)
+        stored_path = os.path.abspath(output_path)
+
+        if self.blob_dir:
+            blob_path = self._blob_path(output_hash, os.path.splitext(output_path)[1].lower())
+            if (not os.path.exists(blob_path)
+                    or os.path.getsize(blob_path) != os.path.getsize(output_path)):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                tmp_path = f'{blob_path}.{os.getpid()}.tmp'
+                shutil.copyfile(output_path, tmp_path)
+                os.replace(tmp_path, blob_path)
+            stored_path = os.path.abspath(blob_path)
+
+        stat = os.stat(stored_path)
+        self.db.put_render(render_key, template_hash, data_hash, self.engine_version,
+                           stored_path, output_hash, stat.st_size, stat.st_mtime_ns)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
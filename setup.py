@@ -15,6 +15,19 @@ setup(
     long_description_content_type='text/markdown',
     url='https://github.com/yourusername/docufiller',
     packages=find_packages(),
+    py_modules=[
+        'analysis_cache', 'batch_runner', 'database_manager', 'document_filler',
+        'document_processor', 'docufiller_cli', 'docx_walker', 'dry_run', 'field_detector',
+        'field_record', 'fill_profiler', 'fill_worker', 'key_index', 'keyword_automaton',
+        'ocr_processor', 'output_sinks', 'pdf_extraction', 'pdf_locator', 'render_cache',
+        'template_cache', 'template_store',
+    ],
+    entry_points={
+        'console_scripts': [
+            'docufiller=docufiller_cli:main',
+            'docufiller-worker=fill_worker:main',
+        ],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',
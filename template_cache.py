@@ -0,0 +1,70 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+
+class TemplateCache:
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _signature(self, template_path: str) -> Tuple[str, int, int]:
+        stat = os.stat(template_path)
+        return (os.path.abspath(template_path), stat.st_mtime_ns, stat.st_size)
+
+    def get(self, template_path: str) -> Dict[str, Any]:
+        signature = self._signature(template_path)
+
+        with self._lock:
+            entry = self._entries.get(signature[0])
+            if entry is not None and entry['signature'] == signature:
+                self._entries.move_to_end(signature[0])
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        with open(template_path, 'rb') as f:
+            content = f.read()
+
+        entry = {
+            'signature': signature,
+            'content': content,
+            'content_hash': hashlib.sha256(content).hexdigest(),
+            'artifacts': {}
+        }
+
+        with self._lock:
+            self._entries[signature[0]] = entry
+            self._entries.move_to_end(signature[0])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    def get_artifact(self, entry: Dict[str, Any], name: str,
+                     builder: Callable[[Dict[str, Any]], Any]) -> Any:
+        artifacts = entry['artifacts']
+        if name not in artifacts:
+            artifacts[name] = builder(entry)
+        return artifacts[name]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
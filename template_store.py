@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import shutil
+import socket
+from typing import Dict, Optional
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _atomic_write(path: str, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{socket.gethostname()}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class TemplateStore:
+
+    def __init__(self, root: str, local_dir: Optional[str] = None):
+        self.root = root
+        self.local_dir = local_dir
+        os.makedirs(os.path.join(root, 'templates'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'mappings'), exist_ok=True)
+        if local_dir:
+            os.makedirs(local_dir, exist_ok=True)
+
+    def _template_path(self, root: str, content_hash: str, ext: str) -> str:
+        return os.path.join(root, 'templates', content_hash[:2], f'{content_hash}{ext}')
+
+    def put(self, template_path: str) -> str:
+        content_hash = _file_hash(template_path)
+        ext = os.path.splitext(template_path)[1].lower()
+        stored_path = self._template_path(self.root, content_hash, ext)
+        if not os.path.exists(stored_path):
+            with open(template_path, 'rb') as f:
+                _atomic_write(stored_path, f.read())
+        return content_hash
+
+    def fetch(self, content_hash: str, ext: str) -> str:
+        shared_path = self._template_path(self.root, content_hash, ext)
+        if not self.local_dir:
+            if not os.path.exists(shared_path):
+                raise FileNotFoundError(f"Шаблон отсутствует в хранилище: {content_hash}")
+            return shared_path
+
+        local_path = self._template_path(self.local_dir, content_hash, ext)
+        if not os.path.exists(local_path):
+            if not os.path.exists(shared_path):
+                raise FileNotFoundError(f"Шаблон отсутствует в хранилище: {content_hash}")
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            tmp_path = f'{local_path}.{socket.gethostname()}.{os.getpid()}.tmp'
+            shutil.copyfile(shared_path, tmp_path)
+            os.replace(tmp_path, local_path)
+        return local_path
+
+    def _mapping_path(self, key: str) -> str:
+        return os.path.join(self.root, 'mappings', key[:2], f'{key}.json')
+
+    def get_mapping(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._mapping_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_mapping(self, key: str, mapping: Dict):
+        _atomic_write(self._mapping_path(key),
+                      json.dumps(mapping, ensure_ascii=False).encode('utf-8'))
@@ -0,0 +1,48 @@
+import unittest
+from unittest import mock
+
+from field_detector import FieldDetector
+
+
+class FieldDetectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.detector = FieldDetector()
+        self.detector._get_llm_model = mock.Mock(side_effect=RuntimeError('offline'))
+
+    def detect(self, text: str):
+        with mock.patch('builtins.print'):
+            return [(field['type'], field['text'], field['field_name'])
+                    for field in self.detector.detect_fields_in_text(text)]
+
+    def test_double_braces_not_reported_as_single(self):
+        self.assertEqual(self.detect('Дата: {{date}}'),
+                         [('date_marker', 'Дата', 'date'), ('double_braces', '{{date}}', 'date')])
+
+    def test_underscore_run_is_one_field(self):
+        self.assertEqual(self.detect('Подпись ________'),
+                         [('signature_marker', 'Подпись', 'signature'),
+                          ('long_underscore', '________', 'signature')])
+
+    def test_priority_tie_broken_by_length(self):
+        self.assertEqual(self.detect('<a [b] c>'), [('square_brackets', '[b]', 'b')])
+
+        self.detector.pattern_priorities['angle_brackets'] = self.detector.pattern_priorities['square_brackets']
+        self.assertEqual(self.detect('<a [b] c>'), [('angle_brackets', '<a [b] c>', 'a [b] c')])
+
+    def test_blank_named_by_nearest_keyword(self):
+        blanks = [(text, field_name)
+                  for field_type, text, field_name in self.detect('Организация: ____ ИНН ____')
+                  if field_type == 'medium_underscore']
+        self.assertEqual(blanks, [('____', 'organization'), ('____', 'inn')])
+
+    def test_keyword_outside_window_is_ignored(self):
+        self.detector.context_window = 10
+        blanks = [field_name for field_type, _, field_name
+                  in self.detect('ИНН' + ' ' * 20 + '____')
+                  if field_type == 'medium_underscore']
+        self.assertEqual(blanks, [None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from database_manager import DatabaseManager
+from fill_worker import FillWorker
+
+
+class StubFiller:
+
+    def __init__(self, failures: int = 0, delay: float = 0.0):
+        self.failures = failures
+        self.delay = delay
+        self.calls = []
+
+    def fill_document(self, template_path, data, output_path, mapping=None):
+        self.calls.append((template_path, data, output_path))
+        time.sleep(self.delay)
+        if len(self.calls) <= self.failures:
+            raise RuntimeError('render failed')
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(repr(data))
+        return output_path
+
+
+def run_node(db_path: str, worker_id: str):
+    with DatabaseManager(db_path) as db:
+        worker = FillWorker(db, filler=StubFiller(delay=0.02), worker_id=worker_id,
+                            lease_seconds=1.0, poll_interval=0.05, heartbeat_interval=0.2)
+        worker.run(idle_timeout=3.0)
+
+
+class FillWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.tmp_dir, 'queue.db'))
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def output(self, name: str) -> str:
+        return os.path.join(self.tmp_dir, 'out', name)
+
+    def history(self):
+        return sorted((row['output_path'], row['status'])
+                      for row in self.db.get_document_history(limit=100))
+
+    def test_enqueue_and_claim(self):
+        low = self.db.enqueue_fill_job('a.docx', self.output('a.docx'), data={'n': 1})
+        high = self.db.enqueue_fill_job('b.docx', self.output('b.docx'), priority=5)
+
+        job = self.db.claim_fill_job('w1', lease_seconds=60)
+        self.assertEqual(job['id'], high)
+        self.assertEqual(job['attempts'], 1)
+        self.assertEqual(job['lease_owner'], 'w1')
+
+        job = self.db.claim_fill_job('w2', lease_seconds=60)
+        self.assertEqual(job['id'], low)
+        self.assertEqual(job['data'], {'n': 1})
+
+        self.assertIsNone(self.db.claim_fill_job('w3', lease_seconds=60))
+        self.assertEqual(self.db.get_fill_queue_stats()['running'], 2)
+
+    def test_worker_completes_job(self):
+        job_id = self.db.enqueue_fill_job('a.docx', self.output('a.docx'), data={'n': 1})
+        worker = FillWorker(self.db, filler=StubFiller(), worker_id='w1')
+
+        result = worker.run_once()
+        self.assertTrue(result['success'])
+        self.assertTrue(os.path.exists(self.output('a.docx')))
+        self.assertIsNone(worker.run_once())
+
+        job = self.db.get_fill_job(job_id)
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(job['history_id'], result['history_id'])
+        self.assertEqual(self.history(), [(self.output('a.docx'), 'completed')])
+
+    def test_run_reports_stats_for_plain_filler(self):
+        self.db.enqueue_fill_job('a.docx', self.output('a.docx'))
+        stats = FillWorker(self.db, filler=StubFiller(), worker_id='w1',
+                           poll_interval=0.01).run(idle_timeout=0.05)
+
+        self.assertEqual(stats['jobs_completed'], 1)
+        self.assertIsNone(stats['template_cache'])
+        self.assertIsNone(stats['mapping_cache_entries'])
+        self.assertIsNone(stats['render_cache'])
+
+    def test_retry_until_max_attempts(self):
+        job_id = self.db.enqueue_fill_job('a.docx', self.output('a.docx'), max_attempts=3)
+        worker = FillWorker(self.db, filler=StubFiller(failures=5), worker_id='w1', retry_delay=0)
+
+        statuses = [worker.run_once()['status'] for _ in range(3)]
+        self.assertEqual(statuses, ['pending', 'pending', 'failed'])
+        self.assertIsNone(worker.run_once())
+
+        job = self.db.get_fill_job(job_id)
+        self.assertEqual(job['attempts'], 3)
+        self.assertEqual(job['last_error'], 'render failed')
+        self.assertEqual(worker.jobs_retried, 2)
+        self.assertEqual(worker.jobs_failed, 1)
+        self.assertEqual(self.history(), [(self.output('a.docx'), 'failed')])
+
+    def test_retry_then_success(self):
+        self.db.enqueue_fill_job('a.docx', self.output('a.docx'), max_attempts=3)
+        worker = FillWorker(self.db, filler=StubFiller(failures=1), worker_id='w1', retry_delay=0)
+
+        self.assertEqual(worker.run_once()['status'], 'pending')
+        self.assertEqual(worker.run_once()['status'], 'completed')
+        self.assertEqual(self.history(), [(self.output('a.docx'), 'completed')])
+
+    def test_expired_lease_is_reclaimed(self):
+        job_id = self.db.enqueue_fill_job('a.docx', self.output('a.docx'), max_attempts=3)
+        stale = self.db.claim_fill_job('w1', lease_seconds=0.01)
+        time.sleep(0.05)
+
+        job = self.db.claim_fill_job('w2', lease_seconds=60)
+        self.assertEqual(job['id'], job_id)
+        self.assertEqual(job['attempts'], 2)
+        self.assertFalse(self.db.complete_fill_job(stale['id'], 'w1'))
+        self.assertTrue(self.db.complete_fill_job(job['id'], 'w2'))
+
+    def test_expired_exhausted_job_is_recorded(self):
+        job_id = self.db.enqueue_fill_job('a.docx', self.output('a.docx'), max_attempts=1)
+        self.db.claim_fill_job('w1', lease_seconds=0.01)
+        time.sleep(0.05)
+
+        self.assertIsNone(self.db.claim_fill_job('w2', lease_seconds=60))
+
+        job = self.db.get_fill_job(job_id)
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['last_error'], 'lease expired')
+        self.assertIsNotNone(job['history_id'])
+        self.assertEqual(self.history(), [(self.output('a.docx'), 'failed')])
+
+    def test_lost_lease_is_not_recorded(self):
+        self.db.enqueue_fill_job('a.docx', self.output('a.docx'))
+        stale = self.db.claim_fill_job('w1', lease_seconds=0.01)
+        time.sleep(0.05)
+        self.db.claim_fill_job('w2', lease_seconds=60)
+
+        worker = FillWorker(self.db, filler=StubFiller(), worker_id='w1')
+        result = worker.process_job(stale)
+        self.assertEqual(result['status'], 'lease_lost')
+        self.assertEqual(worker.jobs_completed, 0)
+        self.assertEqual(worker.jobs_lost, 1)
+        self.assertEqual(self.history(), [])
+
+
+class ShardedNodesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'queue.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_nodes_drain_batch_after_one_is_killed(self):
+        total = 60
+        with DatabaseManager(self.db_path) as db:
+            db.enqueue_fill_jobs([{'template_path': 'a.docx',
+                                   'output_path': os.path.join(self.tmp_dir, 'out', f'{i}.docx'),
+                                   'data': {'n': i}} for i in range(total)],
+                                 batch_id='batch', max_attempts=5)
+
+        context = multiprocessing.get_context('spawn')
+        nodes = [context.Process(target=run_node, args=(self.db_path, f'node{i}'))
+                 for i in range(3)]
+        for node in nodes:
+            node.start()
+
+        with DatabaseManager(self.db_path) as db:
+            deadline = time.time() + 30
+            while db.get_fill_queue_stats('batch')['completed'] < 5 and time.time() < deadline:
+                time.sleep(0.05)
+            nodes[0].kill()
+
+            for node in nodes:
+                node.join(60)
+            stats = db.get_fill_queue_stats('batch')
+            history = db.get_document_history(limit=total * 2)
+
+        self.assertEqual([node.exitcode for node in nodes[1:]], [0, 0])
+        self.assertEqual(stats['completed'], total)
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(len(history), total)
+        self.assertEqual(len({row['output_path'] for row in history}), total)
+        self.assertTrue(all(row['status'] == 'completed' for row in history))
+
+
+if __name__ == '__main__':
+    unittest.main()
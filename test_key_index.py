@@ -0,0 +1,31 @@
+import unittest
+
+from key_index import KeyIndex
+
+
+class KeyIndexTest(unittest.TestCase):
+
+    def test_exact_normalized_and_synonym_matches(self):
+        index = KeyIndex(['inn', 'Full Name', 'org_address'])
+        self.assertEqual(index.match('inn'), ('inn', 1.0))
+        self.assertEqual(index.match('fullname'), ('Full Name', 0.95))
+        self.assertEqual(index.match('ИНН'), ('inn', 0.9))
+
+    def test_suffix_does_not_match(self):
+        self.assertIsNone(KeyIndex(['bank_name', 'org_inn']).match('name'))
+
+    def test_suffix_loses_to_synonym(self):
+        index = KeyIndex(['bank_name', 'full_name'])
+        self.assertEqual(index.match('name'), ('full_name', 0.9))
+
+    def test_leading_segment_matches(self):
+        index = KeyIndex(['contract_number', 'bank_name'])
+        self.assertEqual(index.match('contract'), ('contract_number', 0.6667))
+
+    def test_trigram_match_picks_best_key(self):
+        index = KeyIndex(['org_name', 'org_address', 'person_address'])
+        self.assertEqual(index.match('org_adress')[0], 'org_address')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pymupdf as fitz
+
+from document_filler import DocumentFiller
+from field_detector import FieldDetector
+from ocr_processor import OCRProcessor
+
+SCANNED_WORDS = [
+    {'text': 'Дата:', 'bbox': (50.0, 100.0, 90.0, 115.0), 'conf': 91.0, 'line': (1, 1, 1)},
+    {'text': '{{date}}', 'bbox': (95.0, 100.0, 150.0, 115.0), 'conf': 88.0, 'line': (1, 1, 1)},
+    {'text': 'ИНН', 'bbox': (50.0, 130.0, 75.0, 145.0), 'conf': 93.0, 'line': (1, 1, 2)},
+    {'text': '__________', 'bbox': (80.0, 130.0, 160.0, 145.0), 'conf': 70.0, 'line': (1, 1, 2)},
+]
+
+
+def fake_ocr_page(pdf_path, page_num, dpi, languages):
+    return [dict(word) for word in SCANNED_WORDS]
+
+
+class OCRProcessorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.tmp_dir, 'scan.pdf')
+
+        scan = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 120, 160), False)
+        scan.clear_with(230)
+        doc = fitz.open()
+        doc.new_page().insert_image(fitz.Rect(0, 0, 595, 842), pixmap=scan)
+        doc.new_page().insert_text((50, 100), 'Organization: {{organization}}', fontsize=11)
+        doc.save(self.pdf_path)
+        doc.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def processor(self) -> OCRProcessor:
+        return OCRProcessor(cache_dir=os.path.join(self.tmp_dir, 'ocr'), workers=1)
+
+    def test_finds_image_only_pages(self):
+        self.assertEqual(self.processor().find_image_only_pages(self.pdf_path), [0])
+
+    def test_cache_hits(self):
+        processor = self.processor()
+        with mock.patch('ocr_processor._ocr_page', side_effect=fake_ocr_page) as ocr_page:
+            first = processor.ocr_pages(self.pdf_path)
+            second = processor.ocr_pages(self.pdf_path)
+            self.assertEqual(ocr_page.call_count, 1)
+
+            from_disk = self.processor()
+            self.assertEqual(from_disk.ocr_pages(self.pdf_path), first)
+            self.assertEqual(ocr_page.call_count, 1)
+
+        self.assertEqual(first, second)
+        self.assertEqual([line['text'] for line in first[0]], ['Дата: {{date}}', 'ИНН __________'])
+        self.assertEqual(processor.get_stats()['hits'], 1)
+        self.assertEqual(processor.get_stats()['misses'], 1)
+        self.assertEqual(from_disk.get_stats()['hits'], 1)
+
+    def test_detects_and_fills_scanned_fields(self):
+        detector = FieldDetector(ocr_processor=self.processor())
+        with mock.patch('ocr_processor._ocr_page', side_effect=fake_ocr_page):
+            fields = detector.detect_fields_in_pdf(self.pdf_path, workers=1)
+
+            scanned = {field['field_name']: field for field in fields if field.get('source') == 'ocr'}
+            self.assertEqual(set(scanned), {'date', 'inn'})
+            self.assertEqual(tuple(scanned['date']['bbox']), SCANNED_WORDS[1]['bbox'])
+            self.assertEqual([field['field_name'] for field in fields if field['page'] == 1],
+                             ['organization'])
+
+            filler = DocumentFiller()
+            filler.field_detector.ocr_processor = self.processor()
+            filler.field_detector._get_llm_model = mock.Mock(side_effect=RuntimeError('offline'))
+            output_path = os.path.join(self.tmp_dir, 'filled.pdf')
+            filler.fill_document(self.pdf_path, {'date': '01.02.2024', 'inn': '7701'}, output_path)
+
+        with fitz.open(output_path) as doc:
+            page = doc[0]
+            self.assertIn('01.02.2024', page.get_text())
+            covered = [tuple(drawing['rect']) for drawing in page.get_drawings()
+                       if drawing.get('fill') == (1.0, 1.0, 1.0)]
+            self.assertEqual(covered, [SCANNED_WORDS[1]['bbox']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from docx import Document
+
+from database_manager import DatabaseManager
+from document_filler import DocumentFiller
+from render_cache import RenderCache
+
+
+class RenderCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.template_path = self.path('template.docx')
+        doc = Document()
+        doc.add_paragraph('ФИО: {full_name}')
+        doc.save(self.template_path)
+        self.db = DatabaseManager(self.path('cache.db'))
+        self.print_patch = mock.patch('builtins.print')
+        self.print_patch.start()
+
+    def tearDown(self):
+        self.print_patch.stop()
+        self.db.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.tmp_dir, name)
+
+    def filler(self, blob_dir=None) -> DocumentFiller:
+        filler = DocumentFiller(render_cache=RenderCache(self.db, blob_dir=blob_dir))
+        filler.field_detector._get_llm_model = mock.Mock(side_effect=RuntimeError('offline'))
+        return filler
+
+    def fill(self, filler: DocumentFiller, name: str, output_name: str) -> str:
+        output_path = self.path(output_name)
+        filler.fill_document(self.template_path, {'full_name': name}, output_path)
+        return output_path
+
+    def read(self, path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def text(self, path: str) -> str:
+        return '\n'.join(paragraph.text for paragraph in Document(path).paragraphs)
+
+    def test_hit_produces_identical_output(self):
+        filler = self.filler()
+        first = self.fill(filler, 'Иванов', 'first.docx')
+        with mock.patch.object(filler, '_render_document') as render:
+            second = self.fill(filler, 'Иванов', 'second.docx')
+            render.assert_not_called()
+
+        self.assertEqual(self.read(first), self.read(second))
+        self.assertEqual(filler.render_cache.get_stats()['hits'], 1)
+
+    def test_changed_record_does_not_corrupt_linked_output(self):
+        filler = self.filler()
+        first = self.fill(filler, 'Иванов', 'first.docx')
+        original = self.read(first)
+        second = self.fill(filler, 'Иванов', 'second.docx')
+        self.assertTrue(os.path.samefile(first, second))
+
+        self.fill(filler, 'Петров', 'second.docx')
+
+        self.assertEqual(self.read(first), original)
+        self.assertIn('Иванов', self.text(first))
+        self.assertIn('Петров', self.text(second))
+        self.assertEqual(self.read(self.fill(filler, 'Иванов', 'third.docx')), original)
+
+    def test_modified_blob_is_a_miss(self):
+        filler = self.filler(blob_dir=self.path('blobs'))
+        self.fill(filler, 'Иванов', 'first.docx')
+        for root, _, files in os.walk(self.path('blobs')):
+            for name in files:
+                with open(os.path.join(root, name), 'ab') as f:
+                    f.write(b'corrupted')
+
+        second = self.fill(filler, 'Иванов', 'second.docx')
+
+        self.assertEqual(filler.render_cache.get_stats()['misses'], 2)
+        self.assertIn('Иванов', self.text(second))
+
+    def test_modified_output_is_a_miss(self):
+        filler = self.filler()
+        first = self.fill(filler, 'Иванов', 'first.docx')
+        with open(first, 'ab') as f:
+            f.write(b'corrupted')
+
+        second = self.fill(filler, 'Иванов', 'second.docx')
+
+        self.assertEqual(filler.render_cache.get_stats()['misses'], 2)
+        self.assertNotEqual(self.read(first), self.read(second))
+        self.assertIn('Иванов', self.text(second))
+
+
+if __name__ == '__main__':
+    unittest.main()